@@ -2,18 +2,18 @@
 # File layout controlled by Emacs folding.el available at:
 # https://github.com/jaalto/project-emacs--folding-mode.
 
-import sys, os, stat, ipaddr, configobj, hashlib, re, io, json
+import sys, os, stat, ipaddr, configobj, hashlib, re, io, json, pickle, time
 import base64, random, string
 import math, abc
-import functools
+import functools, contextlib, copy
 from urllib.parse import urlparse
 from collections import OrderedDict as odict
 from typing import Optional
 try:
-    from .util import units2bytes, bytes2units, gen_base64_passwd, get_euid, get_egid, gen_node_uuid, encode_shadow_passwd, is_shadow_encoded, str2sec, sec2str
-    units2bytes, bytes2units, gen_base64_passwd, get_euid, get_egid, gen_node_uuid, encode_shadow_passwd, is_shadow_encoded, str2sec, sec2str #silence pyflakes
+    from .util import units2bytes, bytes2units, gen_base64_passwd, get_euid, get_egid, gen_node_uuid, encode_shadow_passwd, is_shadow_encoded, str2sec, sec2str, atomic_file_writer
+    units2bytes, bytes2units, gen_base64_passwd, get_euid, get_egid, gen_node_uuid, encode_shadow_passwd, is_shadow_encoded, str2sec, sec2str, atomic_file_writer #silence pyflakes
 except:
-    from libconfd.common.util import units2bytes, bytes2units, gen_base64_passwd, get_euid, get_egid, gen_node_uuid, encode_shadow_passwd, is_shadow_encoded, str2sec, sec2str
+    from libconfd.common.util import units2bytes, bytes2units, gen_base64_passwd, get_euid, get_egid, gen_node_uuid, encode_shadow_passwd, is_shadow_encoded, str2sec, sec2str, atomic_file_writer
 
 # {{{ Class EXAConfError
 
@@ -40,6 +40,19 @@ class EXAConfIntegrityError(EXAConfError):
     def __str__(self):
         return repr(self.msg)
 
+# }}}
+# {{{ Class EXAConfConflictError
+
+class EXAConfConflictError(EXAConfError):
+    """
+    Special exception raised if a delta can't be applied because of conflicting changes.
+    """
+    def __init__(self, msg, conflicts = None):
+        self.msg = "ERROR::EXAConf: " + msg
+        self.conflicts = conflicts if conflicts is not None else []
+    def __str__(self):
+        return repr(self.msg)
+
 # }}}
 # {{{ Class config
 
@@ -69,6 +82,20 @@ class config(odict):
     def __setstate__(self, state):
         self.__dict__.update(state)
 
+    def clone(self):
+        """
+        Returns a deep copy of this config. Only nested configs and lists are
+        copied, all other values (strings, numbers, tuples) are immutable and shared.
+        """
+        def clone_value(value):
+            if isinstance(value, config):
+                return value.clone()
+            elif isinstance(value, list):
+                return [ clone_value(e) for e in value ]
+            else:
+                return value
+        return self.__class__((k, clone_value(v)) for (k,v) in self.items())
+
     def to_section(self, ignore_keys = []):
         """
         Returns a dictionary with all members converted so it can be assigned
@@ -237,6 +264,256 @@ class NIDAffinity(NodeAffinity):
     def get_affinity(self, nid: int) -> int:
         return nid
 # }}}
+# {{{ Split section name
+
+@functools.lru_cache(maxsize=None)
+def split_section_name(section):
+    """
+    Splits the given section name (e. g. 'Node : 11') into its (stripped) parts. The
+    result is cached, because section names are checked over and over again.
+    """
+    return tuple(p.strip() for p in section.split(":"))
+
+# }}}
+# {{{ Read EXAConf summary
+
+def read_exaconf_summary(filename):
+    """
+    Returns the revision and the node UUIDs of the given EXAConf file (as a config with 'revision'
+    and 'node_uuids'), without parsing and validating the whole file (i. e. by scanning the lines
+    of the 'Global' and 'Node' sections). The result is cached until the file is modified.
+    """
+    file_stat = os.stat(filename)
+    return _read_exaconf_summary(os.path.abspath(filename), file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+@functools.lru_cache(maxsize=256)
+def _read_exaconf_summary(filename, ino, mtime_ns, size):
+    summary = config()
+    summary.revision = 0
+    summary.node_uuids = odict()
+    section = None
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            if line.startswith("[["):
+                # subsections are not relevant
+                section = None
+            elif line.startswith("["):
+                section = split_section_name(line.strip("[]"))
+            elif section is not None and "=" in line:
+                key, value = (x.strip() for x in line.split("=", 1))
+                value = value.strip("\"'")
+                if section[0] == "Global" and key == "Revision":
+                    summary.revision = int(value)
+                elif section[0] == "Node" and key == "UUID":
+                    summary.node_uuids[section[1]] = value
+    return summary
+
+# }}}
+# {{{ Config deltas
+
+# keys that are managed by 'EXAConf.commit()' and therefore not part of deltas
+delta_ignored_keys = ((("Global",), "Revision"), (("Global",), "Checksum"))
+
+def _raw_section_dict(section):
+    """
+    Returns the content of the given section as a (nested) dict of raw values (i. e. without interpolation).
+    """
+    return dict((key, _raw_section_dict(value) if isinstance(value, configobj.Section) else value)
+                for key, value in dict.items(section))
+
+def _get_delta_section(conf, path):
+    """
+    Returns the (sub-)section of the given config with the given path (list of section names) or None.
+    """
+    section = conf
+    for name in path:
+        if name not in section.sections:
+            return None
+        section = dict.__getitem__(section, name)
+    return section
+
+def _move_after(names, name, after):
+    """
+    Moves 'name' in the given list of names behind 'after' (or to the front if 'after' is None).
+    """
+    if after is not None and after not in names:
+        return
+    names.remove(name)
+    names.insert(names.index(after) + 1 if after is not None else 0, name)
+
+def _diff_sections(old_sec, new_sec, path, delta, ignored):
+    """
+    Appends the operations that transform 'old_sec' into 'new_sec' to 'delta'. 'old_sec' may be None (new section).
+    """
+    old_scalars = old_sec.scalars if old_sec is not None else []
+    old_sections = old_sec.sections if old_sec is not None else []
+    for key in old_scalars:
+        if key not in new_sec.scalars and (tuple(path), key) not in ignored:
+            delta.append({"op": "remove", "path": path, "key": key, "old": dict.__getitem__(old_sec, key)})
+    prev = None
+    for key in new_sec.scalars:
+        if (tuple(path), key) not in ignored:
+            new_val = dict.__getitem__(new_sec, key)
+            comment, inline_comment = new_sec.comments.get(key, []), new_sec.inline_comments.get(key)
+            if key not in old_scalars:
+                delta.append({"op": "set", "path": path, "key": key, "old": None, "new": new_val, "after": prev,
+                              "comment": comment, "inline_comment": inline_comment})
+            elif dict.__getitem__(old_sec, key) != new_val:
+                delta.append({"op": "set", "path": path, "key": key, "old": dict.__getitem__(old_sec, key), "new": new_val,
+                              "comment": comment, "inline_comment": inline_comment})
+            elif old_sec.comments.get(key, []) != comment or old_sec.inline_comments.get(key) != inline_comment:
+                delta.append({"op": "set_comment", "path": path, "key": key,
+                              "comment": comment, "inline_comment": inline_comment})
+        prev = key
+    for name in old_sections:
+        if name not in new_sec.sections:
+            delta.append({"op": "remove_section", "path": path + [name], "old": _raw_section_dict(dict.__getitem__(old_sec, name))})
+    prev = None
+    for name in new_sec.sections:
+        comment, inline_comment = new_sec.comments.get(name, []), new_sec.inline_comments.get(name)
+        if name not in old_sections:
+            delta.append({"op": "add_section", "path": path + [name], "after": prev,
+                          "comment": comment, "inline_comment": inline_comment})
+            _diff_sections(None, dict.__getitem__(new_sec, name), path + [name], delta, ignored)
+        else:
+            if old_sec.comments.get(name, []) != comment or old_sec.inline_comments.get(name) != inline_comment:
+                delta.append({"op": "set_comment", "path": path, "key": name,
+                              "comment": comment, "inline_comment": inline_comment})
+            _diff_sections(dict.__getitem__(old_sec, name), dict.__getitem__(new_sec, name), path + [name], delta, ignored)
+        prev = name
+
+def diff_configs(old_conf, new_conf, ignored = delta_ignored_keys):
+    """
+    Returns the delta between the given configs (ConfigObj instances), i. e. a list of operations
+    that transform 'old_conf' into 'new_conf' (see 'apply_config_delta()'). Each operation is a
+    dict (JSON serializable) with the type ('op'), the section 'path' (list of section names) and:
+        - 'set'            : 'key', 'old' (None if new), 'new' value and comments
+        - 'remove'         : 'key' and 'old' value
+        - 'add_section'    : comments (followed by the operations for the new content)
+        - 'remove_section' : 'old' content
+        - 'set_comment'    : 'key' (scalar or section) and comments
+    New keys and sections contain the name of their predecessor ('after'), so the order is kept.
+    Keys in 'ignored' (tuples of section path and key) are skipped.
+    """
+    delta = []
+    _diff_sections(old_conf, new_conf, [], delta, ignored)
+    return delta
+
+def apply_config_delta(conf, delta, force = False):
+    """
+    Applies the given delta (see 'diff_configs()') to the given config (ConfigObj instance).
+
+    Each operation is checked against the current content: the 'old' value has to match (operations
+    that have already been applied are skipped). Conflicting operations are skipped and returned,
+    unless 'force' is True (then the new values are applied anyway).
+
+    Returns a tuple of the nr. of applied operations and the list of conflicts (strings).
+    """
+    applied = 0
+    conflicts = []
+    for op in delta:
+        path = list(op["path"])
+        if op["op"] in ("add_section", "remove_section"):
+            name = path.pop()
+        section = _get_delta_section(conf, path)
+        location = "".join("[%s]" % p for p in path) if len(path) > 0 else "[]"
+        if section is None:
+            if op["op"] not in ("remove", "remove_section", "set_comment"):
+                conflicts.append("%s: section does not exist" % location)
+            continue
+        if op["op"] == "set":
+            key = op["key"]
+            curr = dict.__getitem__(section, key) if key in section.scalars else None
+            if curr == op["new"]:
+                continue
+            if curr != op["old"] and not force:
+                conflicts.append("%s %s: expected %r, found %r" % (location, key, op["old"], curr))
+                continue
+            section[key] = op["new"]
+            section.comments[key] = list(op.get("comment", section.comments.get(key, [])))
+            section.inline_comments[key] = op.get("inline_comment", section.inline_comments.get(key))
+            if curr is None and "after" in op:
+                _move_after(section.scalars, key, op["after"])
+            applied += 1
+        elif op["op"] == "remove":
+            key = op["key"]
+            if key not in section.scalars:
+                continue
+            if dict.__getitem__(section, key) != op["old"] and not force:
+                conflicts.append("%s %s: expected %r, found %r" % (location, key, op["old"], dict.__getitem__(section, key)))
+                continue
+            del section[key]
+            applied += 1
+        elif op["op"] == "add_section":
+            if name in section.sections:
+                continue
+            if name in section.scalars:
+                conflicts.append("%s %s: is a value, not a section" % (location, name))
+                continue
+            section[name] = {}
+            section.comments[name] = list(op.get("comment", []))
+            section.inline_comments[name] = op.get("inline_comment")
+            if "after" in op:
+                _move_after(section.sections, name, op["after"])
+            applied += 1
+        elif op["op"] == "remove_section":
+            if name not in section.sections:
+                continue
+            if _raw_section_dict(dict.__getitem__(section, name)) != op["old"] and not force:
+                conflicts.append("%s[%s]: section has been modified" % (location, name))
+                continue
+            del section[name]
+            applied += 1
+        elif op["op"] == "set_comment":
+            if op["key"] in section:
+                section.comments[op["key"]] = list(op["comment"])
+                section.inline_comments[op["key"]] = op["inline_comment"]
+        else:
+            conflicts.append("%s: unknown operation '%s'" % (location, op["op"]))
+    return (applied, conflicts)
+
+def format_delta(delta):
+    """
+    Returns a list of human readable lines describing the given delta (comment changes are omitted).
+    """
+    lines = []
+    for op in delta:
+        location = "".join("[%s]" % p for p in op["path"])
+        if op["op"] == "set" and op["old"] is None:
+            lines.append("+ %s %s = %s" % (location, op["key"], op["new"]))
+        elif op["op"] == "set":
+            lines.append("~ %s %s = %s -> %s" % (location, op["key"], op["old"], op["new"]))
+        elif op["op"] == "remove":
+            lines.append("- %s %s = %s" % (location, op["key"], op["old"]))
+        elif op["op"] == "add_section":
+            lines.append("+ %s" % location)
+        elif op["op"] == "remove_section":
+            lines.append("- %s" % location)
+    return lines
+
+# }}}
+# {{{ Modifies config
+
+def _modifies_config(func):
+    """
+    Decorator for all EXAConf methods that (may) modify the configuration: invalidates
+    the cached models after the call and bypasses the cache during the call. Has to be
+    added explicitly to each new method that modifies 'self.config'.
+    """
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        self._mutation_depth += 1
+        try:
+            return func(self, *args, **kwargs)
+        finally:
+            self._mutation_depth -= 1
+            self.invalidate_models()
+    return wrapper
+
+# }}}
 
 class EXAConf(object):
     """
@@ -347,16 +624,52 @@ class EXAConf(object):
     def_logging_LogRotationTypes = ['local', 'remote']
     def_logging_RemoteLogRotationVolume = 'cloud_data_remote_volume'
     def_logging_RemoteLogRotationPrefix = "Logs"
+    checksum_placeholder = "PLACEHOLDER"
+    # format of the cache file (increase if the models change)
+    cache_format = 1
+    # revision journal: max. nr. of entries (older ones are removed) and
+    # max. nr. of deltas between two full snapshots
+    journal_max_entries = 100
+    journal_snapshot_interval = 20
 
     # }}}
     # {{{ Init
 
-    def __init__(self, root = None, initialized = None, filename="EXAConf"):
+    def __init__(self, root = None, initialized = None, filename="EXAConf", use_cache = True, journal = True):
         """
         Creates a new EXAConf instance from the file 'EXAConf' within the given
         root directory. If 'initialized' is true, an exception is thrown if
         the file 'EXAConf' does not exist.
-        """
+
+        If 'use_cache' is true, the integrity check and validation are skipped if the
+        file has not been modified since it has been validated the last time (see
+        'read_cache()'). Otherwise, a new cache file is written. If 'use_cache' is 'ro',
+        an existing cache file is used but never written (e. g. for inspecting foreign
+        or archived configurations).
+
+        If 'journal' is true, each new revision is added to the revision journal
+        (see 'append_journal()').
+        """
+
+        # Cache for the parsed models returned by the getters (see 'get_model()')
+        # NOTE : has to be set up first, because the methods below may already
+        # invalidate the cache
+        self._model_generation = 0
+        self._model_cache = {}
+        self._mutation_depth = 0
+        self._section_index = None
+        # state of the current transaction (see 'transaction()')
+        self._transaction_depth = 0
+        self._transaction_pending = False
+        self._transaction_snapshot = None
+        # MD5 digest of the EXAConf file, as it has been written by this instance,
+        # and the state of the file at that time (see 'get_file_digest()')
+        self._file_digest = None
+        # revision journal (see 'read_journal()') and the parsed content of its
+        # last entry (see 'get_journal_base()')
+        self.journal = journal
+        self._journal_cache = None
+        self._journal_base = None
 
         # Version numbers of the current cluster
         # NOTE : the version numbers are somewhat special. The COS
@@ -397,9 +710,13 @@ class EXAConf(object):
 
         # update and validate content if EXAConf is already initialized
         # also read current version numbers from config
+        cached_models = None
         if self.initialized():
-            self.check_integrity()
-            self.validate()
+            if use_cache:
+                cached_models = self.read_cache()
+            if cached_models is None:
+                self.check_integrity()
+                self.validate()
             if "OSVersion" in self.config["Global"].scalars:
                 self.set_os_version(self.config["Global"]["OSVersion"])
             if "DBVersion" in self.config["Global"].scalars:
@@ -412,9 +729,317 @@ class EXAConf(object):
             if "AuthenticationToken" not in self.config["Global"].scalars:
                 self.config["Global"]["AuthenticationToken"] = self.generate_authentication_token()
                 self.commit()
+            # use the cached models or create a new cache
+            if cached_models is not None:
+                for name, model in cached_models.items():
+                    self._model_cache[name] = (self._model_generation, model)
+            elif use_cache and use_cache != "ro":
+                self.write_cache()
 
         self._affinity_ctrl: 'NIDAffinity' = NIDAffinity()
     # }}}
+    # {{{ Get cache path
+
+    def get_cache_path(self):
+        """
+        Returns the path of the cache file that belongs to the EXAConf file.
+        """
+        return os.path.join(self.root, ".%s.cache" % os.path.basename(self.conf_path))
+
+    # }}}
+    # {{{ Get cache key
+
+    def get_cache_key(self):
+        """
+        Returns the key that identifies the current state of the EXAConf file (inode, size and mtime).
+        """
+        file_stat = os.stat(self.conf_path)
+        return (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+
+    # }}}
+    # {{{ Read cache
+
+    def read_cache(self):
+        """
+        Returns the cached models (see 'get_model()') if the cache file belongs to the current
+        EXAConf file, i. e. the file has been validated and has not been modified since.
+        Returns None otherwise.
+
+        The cache is only used if it's owned by the current user and not writable by anybody
+        else (it's unpickled).
+        """
+        cache_path = self.get_cache_path()
+        try:
+            cache_stat = os.stat(cache_path)
+            if cache_stat.st_uid != get_euid() or cache_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+                return None
+            with open(cache_path, "rb") as f:
+                cache = pickle.load(f)
+            if not isinstance(cache, dict) or \
+               cache.get("format") != self.cache_format or \
+               cache.get("version") != self.version or \
+               cache.get("key") != self.get_cache_key():
+                return None
+        except Exception:
+            return None
+        # checksum protection has to be active, otherwise the content can't be trusted
+        checksum = self.get_checksum()
+        if checksum.upper() in ("NONE", "DISABLED", "COMMIT") or checksum != cache.get("checksum"):
+            return None
+        return cache.get("models")
+
+    # }}}
+    # {{{ Get file digest
+
+    def get_file_digest(self):
+        """
+        Returns the MD5 digest of the EXAConf file, if it has been written by this instance and
+        has not been modified since (i. e. inode, size and mtime are unchanged). Returns None
+        otherwise (the file has to be read in order to compare it).
+        """
+        if self._file_digest is None:
+            return None
+        try:
+            key = self.get_cache_key()
+        except OSError:
+            return None
+        return self._file_digest[1] if key == self._file_digest[0] else None
+
+    # }}}
+    # {{{ Get journal path
+
+    def get_journal_path(self):
+        """
+        Returns the path of the revision journal that belongs to the EXAConf file.
+        """
+        return os.path.join(self.root, ".%s.journal" % os.path.basename(self.conf_path))
+
+    # }}}
+    # {{{ Parse content
+
+    def parse_content(self, content):
+        """
+        Returns a ConfigObj instance for the given (serialized) EXAConf content.
+        """
+        try:
+            return configobj.ConfigObj(io.BytesIO(content),
+                                       list_values = False,
+                                       write_empty_values = True,
+                                       indent_type = '    ')
+        except configobj.ConfigObjError as e:
+            raise EXAConfError("Failed to parse EXAConf content: %s" % e)
+
+    # }}}
+    # {{{ Read journal
+
+    def read_journal(self):
+        """
+        Returns the entries of the revision journal (oldest first). Each entry is a dict containing
+        the revision ('rev'), the 'checksum', the 'time' of the commit and either the full content
+        ('kind' = 'snapshot') or the delta to the previous entry ('kind' = 'delta', see 'diff_configs()').
+        The entries are cached until the journal file is modified.
+        """
+        journal_path = self.get_journal_path()
+        try:
+            file_stat = os.stat(journal_path)
+        except OSError:
+            return []
+        key = (file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns)
+        if self._journal_cache is None or self._journal_cache[0] != key:
+            entries = []
+            with open(journal_path) as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        # incomplete entry (e. g. interrupted write)
+                        continue
+            self._journal_cache = (key, entries)
+        return self._journal_cache[1]
+
+    # }}}
+    # {{{ Get journal base
+
+    def get_journal_base(self, revision, checksum):
+        """
+        Returns the content of the last journal entry (as a ConfigObj instance) if it has the given
+        revision and checksum, i. e. if it's the content of the EXAConf file that is about to be
+        replaced by a commit. Returns None otherwise. The content is kept in memory and updated by
+        'append_journal()', so the EXAConf file is only read and parsed if it's not available.
+        """
+        entries = self.read_journal()
+        if len(entries) == 0 or str(entries[-1]["rev"]) != str(revision) or entries[-1]["checksum"] != checksum:
+            return None
+        base = self._journal_base
+        if base is None or base["Global"].get("Revision") != str(revision) or base["Global"].get("Checksum") != checksum:
+            try:
+                with open(self.conf_path, "rb") as f:
+                    base = self.parse_content(f.read())
+            except (IOError, OSError, EXAConfError):
+                return None
+            if base["Global"].get("Revision") != str(revision) or base["Global"].get("Checksum") != checksum:
+                return None
+            self._journal_base = base
+        return base
+
+    # }}}
+    # {{{ Append journal
+
+    def append_journal(self, new_conf, base = None):
+        """
+        Appends the new revision ('new_conf' is the serialized content) to the revision journal (the
+        journal is only appended, existing entries are never rewritten). The entry contains the delta
+        to 'base', which has to be the content of the last journal entry (see 'get_journal_base()').
+        Otherwise (and after 'journal_snapshot_interval' deltas) the full content is stored. The
+        journal is compacted if it contains too many entries (see 'compact_journal()').
+
+        Errors are ignored (e. g. in case of a read-only directory).
+        """
+        try:
+            entries = self.read_journal()
+            entry = {"rev": self.get_revision(), "checksum": self.get_checksum(), "time": int(time.time())}
+            last_snapshot = max([ num for num, e in enumerate(entries) if e["kind"] == "snapshot" ], default = None)
+            self._journal_base = None
+            if last_snapshot is not None and base is not None and \
+               len(entries) - last_snapshot <= self.journal_snapshot_interval:
+                entry["kind"] = "delta"
+                entry["data"] = diff_configs(base, self.config)
+                # the base is updated, so the next commit doesn't have to parse the file
+                apply_config_delta(base, entry["data"], force = True)
+                base["Global"]["Revision"] = str(entry["rev"])
+                base["Global"]["Checksum"] = entry["checksum"]
+                self._journal_base = base
+            else:
+                entry["kind"] = "snapshot"
+                entry["data"] = new_conf.decode()
+            line = json.dumps(entry) + "\n"
+            journal_path = self.get_journal_path()
+            prev_size = self._journal_cache[0][1] if self._journal_cache is not None and len(entries) > 0 else 0
+            fd = os.open(journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, stat.S_IRUSR | stat.S_IWUSR)
+            with os.fdopen(fd, "w") as f:
+                f.write(line)
+            # update the cached entries (unless somebody else has appended an entry in the meantime)
+            file_stat = os.stat(journal_path)
+            if file_stat.st_size == prev_size + len(line.encode()):
+                self._journal_cache = ((file_stat.st_ino, file_stat.st_size, file_stat.st_mtime_ns), entries + [entry])
+            else:
+                self._journal_cache = None
+            if len(entries) + 1 > self.journal_max_entries + self.journal_snapshot_interval:
+                self.compact_journal()
+        except (IOError, OSError, ValueError, KeyError, EXAConfError):
+            self._journal_base = None
+
+    # }}}
+    # {{{ Compact journal
+
+    def compact_journal(self, max_entries = None):
+        """
+        Removes all but the latest 'max_entries' (default: 'journal_max_entries') entries from the
+        revision journal. The oldest remaining entry is converted into a snapshot.
+        """
+        if max_entries is None:
+            max_entries = self.journal_max_entries
+        entries = self.read_journal()
+        if len(entries) <= max_entries:
+            return
+        first = len(entries) - max_entries
+        kept = list(entries[first:])
+        if kept[0]["kind"] != "snapshot":
+            kept[0] = dict(kept[0], kind = "snapshot", data = self.get_revision_content(kept[0]["rev"], first).decode())
+        with atomic_file_writer(self.get_journal_path(), mode = stat.S_IRUSR | stat.S_IWUSR) as f:
+            for entry in kept:
+                f.write(json.dumps(entry) + "\n")
+        self._journal_cache = None
+
+    # }}}
+    # {{{ Get history
+
+    def get_history(self):
+        """
+        Returns the list of revisions in the revision journal (oldest first). Each entry is a config
+        containing the revision, the checksum, the time of the commit, the kind of the entry and
+        the nr. of changes compared to the previous entry (None for snapshots).
+        """
+        history = []
+        for entry in self.read_journal():
+            conf = config()
+            conf.revision = entry["rev"]
+            conf.checksum = entry["checksum"]
+            conf.time = entry["time"]
+            conf.kind = entry["kind"]
+            conf.changes = len(entry["data"]) if entry["kind"] == "delta" else None
+            history.append(conf)
+        return history
+
+    # }}}
+    # {{{ Get revision content
+
+    def get_revision_content(self, revision, index = None):
+        """
+        Returns the (serialized) content of the given revision from the revision journal, i. e.
+        the nearest snapshot with all subsequent deltas applied. 'index' is the position of the
+        entry within the journal (default: the latest entry with the given revision).
+        """
+        entries = self.read_journal()
+        if index is None:
+            index = max([ num for num, e in enumerate(entries) if e["rev"] == int(revision) ], default = None)
+            if index is None:
+                raise EXAConfError("Revision %s is not in the revision journal of '%s'!" % (revision, self.conf_path))
+        start = index
+        while entries[start]["kind"] != "snapshot":
+            start -= 1
+            if start < 0:
+                raise EXAConfError("Revision journal of '%s' contains no snapshot for revision %s!" % (self.conf_path, revision))
+        conf = self.parse_content(entries[start]["data"].encode())
+        for entry in entries[start + 1:index + 1]:
+            apply_config_delta(conf, entry["data"], force = True)
+        conf["Global"]["Revision"] = str(entries[index]["rev"])
+        conf["Global"]["Checksum"] = entries[index]["checksum"]
+        content = io.BytesIO()
+        conf.write(outfile = content)
+        return content.getvalue()
+
+    # }}}
+    # {{{ Rollback
+
+    @_modifies_config
+    def rollback(self, revision, commit = True):
+        """
+        Restores the content of the given revision from the revision journal. The restored
+        content is committed as a new revision (i. e. the history is kept). Returns the
+        nr. of changed keys / sections.
+        """
+        target = self.parse_content(self.get_revision_content(revision))
+        if self.has_runtime_values():
+            self.normalize_runtime_values()
+        return self.apply_delta(diff_configs(self.config, target), force = True, commit = commit)
+
+    # }}}
+    # {{{ Write cache
+
+    def write_cache(self):
+        """
+        Writes the cache file for the current EXAConf file (has to be validated already).
+        Also fills the model cache. Errors are ignored (e. g. in case of a read-only directory).
+        """
+        models = {"nodes": self.__parse_nodes(),
+                  "volumes": self.__parse_volumes(),
+                  "databases": self.__parse_databases(),
+                  "bucketfs": self.__parse_bucketfs()}
+        for name, model in models.items():
+            self._model_cache[name] = (self._model_generation, model)
+        try:
+            cache = {"format": self.cache_format,
+                     "version": self.version,
+                     "key": self.get_cache_key(),
+                     "checksum": self.get_checksum(),
+                     "models": models}
+            with atomic_file_writer(self.get_cache_path(), mode = stat.S_IRUSR | stat.S_IWUSR, binary = True) as f:
+                pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            pass
+
+    # }}}
     # {{{ Check integrity
 
     def check_integrity(self):
@@ -444,6 +1069,7 @@ class EXAConf(object):
     # }}}
     # {{{ Update self
 
+    @_modifies_config
     def update_self(self):
         """
         Checks if the EXAConf version stored in the file is older than the current one and
@@ -658,6 +1284,7 @@ class EXAConf(object):
     # }}}
     # {{{ Update db version
 
+    @_modifies_config
     def update_db_version(self, db_version):
         """
         Replaces all occurences of the database version number with the given one
@@ -696,6 +1323,7 @@ class EXAConf(object):
     # }}}
     # {{{ Update os version
 
+    @_modifies_config
     def update_os_version(self, os_version):
         """
         Replaces all occurences of the OS version number with the given one
@@ -730,6 +1358,7 @@ class EXAConf(object):
     # }}}
     # {{{ Update re version
 
+    @_modifies_config
     def update_re_version(self, re_version):
         """
         Replaces all occurences of the EXARuntime version number with the given one
@@ -745,6 +1374,7 @@ class EXAConf(object):
     # }}}
     # {{{ Update image version
 
+    @_modifies_config
     def update_img_version(self, img_version):
         """
         Updates the EXABase image version.
@@ -757,6 +1387,7 @@ class EXAConf(object):
     # }}}
     # {{{ Clear configuration
 
+    @_modifies_config
     def clear_config(self):
         """
         Clears all content of the 'EXAConf' file and this EXAConf instance.
@@ -768,41 +1399,188 @@ class EXAConf(object):
     # }}}
     # {{{ Commit
 
+    @_modifies_config
     def commit(self):
         """
         Writes the configuration to disk (into '$RootDir/EXAConf')
+
+        The configuration is only serialized once: the checksum is computed over the
+        serialized content (with placeholders for the revision and checksum), the actual
+        values are filled in afterwards and the result is written to disk.
+
+        Within a transaction, the commit is deferred until the transaction is finished.
         """
 
+        if self._transaction_depth > 0:
+            self._transaction_pending = True
+            # runtime values have to be converted anyway (like during a reload)
+            if self.has_runtime_values():
+                self.normalize_runtime_values()
+            return
+
+        prev_revision = self.get_revision()
         curr_checksum = self.get_checksum()
         # special case : checksum protection is disabled
         if curr_checksum.upper() == "DISABLED":
             # don't store checksum but always increase revision
             self.config["Global"]["Revision"] = str(self.get_revision() + 1)
+            serialized_conf = self.serialize()
         else:
-            new_checksum = self.compute_checksum()
+            serialized_conf, new_checksum = self.serialize_with_checksum()
             # increase revision if old and new checksum are different
             if curr_checksum != new_checksum:
                 self.config["Global"]["Checksum"] = new_checksum
                 self.config["Global"]["Revision"] = str(self.get_revision() + 1)
-        # write config
-        self.config.write()
+            serialized_conf = self.fill_placeholders(serialized_conf)
+        # get the previous content for the revision journal (before it's overwritten)
+        journal_base = None
+        if self.journal and self.get_revision() != prev_revision:
+            journal_base = self.get_journal_base(prev_revision, curr_checksum)
+        # write config (atomically and only if the content has changed)
+        digest = self.write_atomic(self.conf_path, serialized_conf, self.get_file_digest())
+        self._file_digest = (self.get_cache_key(), digest)
         # reload in order to force type conversion
         # --> parameters added as lists during runtime are converted back to strings (as if they have been added manually)
-        self.config.reload()
+        # --> skipped if there are none (the parsed content is identical to the current one)
+        if self.has_runtime_values():
+            self.config.reload()
         # modify permissions
         try:
             os.chmod(self.conf_path, stat.S_IRUSR | stat.S_IWUSR)
         except OSError as e:
             raise EXAConfError("Failed to change permissions for '%s': %s" % (self.conf_path, e))
+        if self.journal and self.get_revision() != prev_revision:
+            self.append_journal(serialized_conf, journal_base)
 
     # }}}
     # {{{ Revert
 
+    @_modifies_config
     def revert(self):
         """
         Revert all changes that have not yet been committed.
         """
         self.config.reload()
+        self._file_digest = None
+
+    # }}}
+    # {{{ Restore snapshot
+
+    @_modifies_config
+    def restore_snapshot(self, snapshot):
+        """
+        Replaces the configuration with the given snapshot (a copy of 'self.config', see 'transaction()').
+        """
+        self.config = snapshot
+
+    # }}}
+    # {{{ Transaction
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Bundles all modifications within a 'with' block:
+
+            with exaconf.transaction():
+                exaconf.add_node(...)
+                exaconf.add_node_device(...)
+
+        All commits within the block are deferred and executed as a single commit when
+        the (outermost) block is left. If an exception is raised, all changes are reverted
+        (i. e. the configuration is restored to the state it had when the outermost block
+        was entered, including changes that have not been committed before) and the
+        exception is re-raised. Transactions can be nested, only the outermost one commits
+        or reverts.
+        """
+        if self._transaction_depth == 0:
+            self._transaction_snapshot = copy.deepcopy(self.config)
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self._transaction_pending = False
+                self.restore_snapshot(self._transaction_snapshot)
+                self._transaction_snapshot = None
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self._transaction_snapshot = None
+            if self._transaction_pending:
+                self._transaction_pending = False
+                self.commit()
+
+    # }}}
+    # {{{ Invalidate models
+
+    def invalidate_models(self):
+        """
+        Invalidates all cached models (see 'get_model()'). Called automatically by all
+        methods that modify the configuration. Has to be called manually after modifying
+        'self.config' directly.
+        """
+        self._model_generation += 1
+        self._model_cache.clear()
+
+    # }}}
+    # {{{ Get model
+
+    def get_model(self, name, parser):
+        """
+        Returns a copy of the model with the given name (e. g. 'nodes'). The model is created
+        by calling 'parser' and cached until the current generation is invalidated. While a
+        modifying method is executed, the cache is bypassed (the config may be half-modified).
+
+        A copy is returned because callers are free to modify the returned configs.
+        """
+        if self._mutation_depth > 0:
+            return parser()
+        entry = self._model_cache.get(name)
+        if entry is None or entry[0] != self._model_generation:
+            entry = (self._model_generation, parser())
+            self._model_cache[name] = entry
+        return entry[1].clone()
+
+    # }}}
+    # {{{ Get section index
+
+    def get_section_index(self):
+        """
+        Returns an index of all top-level sections, i. e. a dict containing:
+            - 'sections' : maps (type, ID) to the section name (e. g. ('Node', '11') -> 'Node : 11')
+            - 'types'    : maps each type to the list of IDs (in file order)
+            - 'max_ids'  : maps each type to the max. numerical ID (if there is one)
+
+        The index is reused as long as the current generation is valid. Otherwise (and while a
+        modifying method is executed) it's only rebuilt if the list of sections has changed.
+        """
+        index = self._section_index
+        if index is not None:
+            if self._mutation_depth == 0 and index["generation"] == self._model_generation:
+                return index
+            if index["section_list"] == self.config.sections:
+                if self._mutation_depth == 0:
+                    index["generation"] = self._model_generation
+                return index
+        index = {"generation": self._model_generation if self._mutation_depth == 0 else None,
+                 "section_list": list(self.config.sections),
+                 "sections": {},
+                 "types": {},
+                 "max_ids": {}}
+        for section in index["section_list"]:
+            parts = split_section_name(section)
+            # skip global sections (e. g. 'Global' or 'BucketFS')
+            if len(parts) < 2:
+                continue
+            sec_type, sec_id = parts[0], parts[1]
+            # the first section wins (as if the sections were searched in file order)
+            index["sections"].setdefault((sec_type, sec_id), section)
+            index["types"].setdefault(sec_type, []).append(sec_id)
+            if sec_id.isdigit():
+                index["max_ids"][sec_type] = max(index["max_ids"].get(sec_type, 0), int(sec_id))
+        self._section_index = index
+        return index
 
     # }}}
     # {{{ Compute checksum
@@ -811,23 +1589,104 @@ class EXAConf(object):
         """
         Computes the MD5 sum of this EXAConf instance (but does NOT store it).
         """
+        return self.serialize_with_checksum()[1]
+
+    # }}}
+    # {{{ Serialize
+
+    def serialize(self):
+        """
+        Returns the content of this EXAConf instance as bytes (exactly as it would be written to disk).
+        """
+        serialized_conf = io.BytesIO()
+        self.config.write(outfile=serialized_conf)
+        return serialized_conf.getvalue()
+
+    # }}}
+    # {{{ Serialize with checksum
+
+    def serialize_with_checksum(self):
+        """
+        Serializes this EXAConf instance with placeholders for the revision and the
+        checksum and returns the content and its MD5 sum (i. e. the checksum).
+        """
 
         # replace and remember current revision and checksum
         curr_revision = self.config["Global"]["Revision"]
         curr_md5 = self.config["Global"]["Checksum"]
-        self.config["Global"]["Revision"] = "PLACEHOLDER"
-        self.config["Global"]["Checksum"] = "PLACEHOLDER"
-        # write config to string
-        serialized_conf = io.BytesIO()
-        self.config.write(outfile=serialized_conf)
+        self.config["Global"]["Revision"] = self.checksum_placeholder
+        self.config["Global"]["Checksum"] = self.checksum_placeholder
+        try:
+            serialized_conf = self.serialize()
+        finally:
+            # restore revision and checksum
+            self.config["Global"]["Revision"] = curr_revision
+            self.config["Global"]["Checksum"] = curr_md5
         # compute MD5 sum
         md5 = hashlib.md5()
-        md5.update(serialized_conf.getvalue())
-        new_md5 = md5.hexdigest()
-        # restore revision and checksum
-        self.config["Global"]["Revision"] = curr_revision
-        self.config["Global"]["Checksum"] = curr_md5
-        return new_md5
+        md5.update(serialized_conf)
+        return (serialized_conf, md5.hexdigest())
+
+    # }}}
+    # {{{ Fill placeholders
+
+    def fill_placeholders(self, serialized_conf):
+        """
+        Replaces the revision and checksum placeholders in the given content (created by
+        'serialize_with_checksum()') with the current values. Serializes this instance
+        again if the placeholders can't be found.
+        """
+        start = serialized_conf.find(b"[Global]")
+        if start >= 0:
+            head, tail = serialized_conf[:start], serialized_conf[start:]
+            for key in ("Revision", "Checksum"):
+                pattern = re.compile(rb"^([ \t]*" + key.encode() + rb"[ \t]*=[ \t]*)" + self.checksum_placeholder.encode() + rb"([ \t\r]*)$", re.M)
+                value = str(self.config["Global"][key]).encode()
+                tail, num = pattern.subn(lambda m: m.group(1) + value + m.group(2), tail, count=1)
+                if num != 1:
+                    return self.serialize()
+            return head + tail
+        return self.serialize()
+
+    # }}}
+    # {{{ Has runtime values
+
+    def has_runtime_values(self, section = None):
+        """
+        Returns True if the given section (default: the whole config) contains values that
+        are not strings (e. g. lists or bools added during runtime). Those are converted to
+        strings by reloading the file.
+        """
+        if section is None:
+            section = self.config
+        # NOTE : access the raw values (avoids the interpolation done by 'Section.__getitem__()')
+        for value in dict.values(section):
+            if isinstance(value, configobj.Section):
+                if self.has_runtime_values(value):
+                    return True
+            elif not isinstance(value, str):
+                return True
+        return False
+
+    # }}}
+    # {{{ Normalize runtime values
+
+    def normalize_runtime_values(self):
+        """
+        Converts all values that are not strings (see 'has_runtime_values()') to the strings
+        they would become by writing and reloading the file (without touching the file).
+        """
+        parsed_conf = configobj.ConfigObj(io.BytesIO(self.serialize()),
+                                          list_values = False,
+                                          write_empty_values = True,
+                                          indent_type = '    ')
+        def normalize(section, parsed_section):
+            for key, value in list(dict.items(section)):
+                if isinstance(value, configobj.Section):
+                    normalize(value, dict.__getitem__(parsed_section, key))
+                elif not isinstance(value, str):
+                    section[key] = dict.__getitem__(parsed_section, key)
+        normalize(self.config, parsed_conf)
 
     # }}}
     # {{{ Get checksum
@@ -868,10 +1727,33 @@ class EXAConf(object):
 
     def write_copy(self, filename):
         """
-        Writes a copy of this EXAConf instance to the given outfile.
+        Writes a copy of this EXAConf instance to the given outfile (atomically).
+        Returns the MD5 digest of the written content.
         """
-        with open(filename, 'wb') as f:
-            self.config.write(outfile=f)
+        return self.write_atomic(filename, self.serialize())
+
+    # }}}
+    # {{{ Write atomic
+
+    def write_atomic(self, filename, serialized_conf, digest = None):
+        """
+        Writes the given content atomically to the given file: the content is written to a
+        temporary file (with permissions 0600), synced to disk and renamed. The file is not
+        replaced if its content is identical. 'digest' is the MD5 digest of the existing file
+        (if known, so it does not have to be read). Returns the MD5 digest of the content.
+        """
+        # keep the owner of an existing file (only possible as root)
+        uid = gid = None
+        if get_euid() == 0 and os.path.exists(filename):
+            file_stat = os.stat(filename)
+            uid, gid = file_stat.st_uid, file_stat.st_gid
+        try:
+            with atomic_file_writer(filename, mode = stat.S_IRUSR | stat.S_IWUSR,
+                                    uid = uid, gid = gid, binary = True, digest = digest) as f:
+                f.write(serialized_conf)
+        except (IOError, OSError) as e:
+            raise EXAConfError("Failed to write '%s': %s" % (filename, e))
+        return f.digest()
 
     # }}}
     # {{{ Platform valid
@@ -894,6 +1776,7 @@ class EXAConf(object):
     # }}}
     # {{{ Initialize legacy
 
+    @_modifies_config
     def initialize_legacy (self, config_obj: dict) -> None:
         kwargs: dict = {k : v for k, v in config_obj.items () if k in self.initialize.__code__.co_varnames}
         self.initialize (**kwargs)
@@ -901,6 +1784,7 @@ class EXAConf(object):
     # }}}
     # {{{ Initialize DB IdP
 
+    @_modifies_config
     def initialize_db_idp (self, config_obj: dict) -> None:
         db_idp_config = config ()
         db_idp_config['params'] = ''
@@ -920,6 +1804,7 @@ class EXAConf(object):
     # }}}
     # {{{ Initialize
 
+    @_modifies_config
     def initialize(self, name, image, num_nodes, device_type, force, platform,
                    db_version=None, os_version=None, re_version = None,
                    img_version=None, license=None,
@@ -1079,11 +1964,10 @@ class EXAConf(object):
         self.add_default_users(def_owner[0])
 
         # Node sections
-        for node in range (1, num_nodes+1):
-            node_id = self.max_reserved_node_id + node
-            self.add_node(priv_net = "10.10.10.%i/24" % node_id, nid = node_id,
-                          no_odirect = no_odirect, template_mode = template_mode,
-                          commit = False)
+        node_ids = [ self.max_reserved_node_id + node for node in range(1, num_nodes+1) ]
+        self.add_nodes([ {"priv_net" : "10.10.10.%i/24" % node_id, "nid" : node_id,
+                          "no_odirect" : no_odirect, "template_mode" : template_mode} for node_id in node_ids ],
+                       commit = False)
 
         # EXAStorage sections
         self.config["EXAStorage"] = {}
@@ -1275,7 +2159,7 @@ class EXAConf(object):
         """
         Returns true if the given section is a node.
         """
-        return section.split(":")[0].strip() == "Node"
+        return split_section_name(section)[0] == "Node"
 
     # }}}
     # {{{ Check if section is a volume
@@ -1284,7 +2168,7 @@ class EXAConf(object):
         """
         Returns true if the given section is an EXAStorage volume.
         """
-        return section.split(":")[0].strip() == "EXAVolume"
+        return split_section_name(section)[0] == "EXAVolume"
 
     # }}}
     # {{{ Check if section is a object volume
@@ -1293,7 +2177,7 @@ class EXAConf(object):
         """
         Returns true if the given section is a object volume.
         """
-        return section.split(":")[0].strip() == "ObjectVolume"
+        return split_section_name(section)[0] == "ObjectVolume"
 
     # }}}
     # {{{ Check if section is a remote volume
@@ -1302,7 +2186,7 @@ class EXAConf(object):
         """
         Returns true if the given section is a remote volume.
         """
-        return section.split(":")[0].strip() == "RemoteVolume"
+        return split_section_name(section)[0] == "RemoteVolume"
 
     # }}}
     # {{{ Check if section is a database
@@ -1311,7 +2195,7 @@ class EXAConf(object):
         """
         Returns true if the given section is an EXASolution database.
         """
-        return section.split(":")[0].strip() == "DB"
+        return split_section_name(section)[0] == "DB"
 
     # }}}
     # {{{ Check if section is a backup schedule
@@ -1320,7 +2204,7 @@ class EXAConf(object):
         """
         Returns true if the given section is an EXASolution backup schedule.
         """
-        return section.split(":")[0].strip() == "Backup"
+        return split_section_name(section)[0] == "Backup"
 
     # }}}
     # {{{ Check if section is a BucketFS
@@ -1330,7 +2214,7 @@ class EXAConf(object):
         Returns true if the given section is a BucketFS.
         """
         # don't try to split the global section!
-        return section != "BucketFS" and section.split(":")[0].strip() == "BucketFS"
+        return section != "BucketFS" and split_section_name(section)[0] == "BucketFS"
 
     # }}}
     # {{{ Check if section is a bucket
@@ -1339,7 +2223,7 @@ class EXAConf(object):
         """
         Returns true if the given section is a bucket.
         """
-        return section.split(":")[0].strip() == "Bucket"
+        return split_section_name(section)[0] == "Bucket"
 
     # }}}
     # {{{ Check if section is a disk
@@ -1348,7 +2232,7 @@ class EXAConf(object):
         """
         Returns true if the given section is a disk.
         """
-        return section.split(":")[0].strip() == "Disk"
+        return split_section_name(section)[0] == "Disk"
 
     # }}}
     # {{{ Check if IP is valid
@@ -1401,10 +2285,10 @@ class EXAConf(object):
         if not self.net_is_valid(node_net):
             raise EXAConfError("String '%s' is not a valid network (valid example: '10.10.10.11/16')!" % node_net)
         try:
-            res = str(ipaddr.IPNetwork(net))
+            res = str(ipaddr.IPNetwork(node_net))
             return res
         except ValueError:
-            raise EXAConfError("Failed to convert '%s' to an IP network." % net)
+            raise EXAConfError("Failed to convert '%s' to an IP network." % node_net)
 
     # }}}
     # {{{ IP type
@@ -1452,6 +2336,7 @@ class EXAConf(object):
 
     # }}}
     # {{{
+    @_modifies_config
     def reset_node_affinity (self, commit: Optional[bool] = True) -> None:
         nodes = self.get_nodes()
         for nid in nodes.keys():
@@ -1463,6 +2348,7 @@ class EXAConf(object):
 
     # {{{ Add node
 
+    @_modifies_config
     def add_node(self, priv_net, nid = None, name = None, pub_net = None, UUID = None,
                  no_odirect = False, template_mode = False, state = None, affinity = None, commit = True):
         """
@@ -1481,6 +2367,62 @@ class EXAConf(object):
         if node_name is None:
             node_name = "n" + str(node_id)
 
+        res = self.__create_node_section(node_id, node_name, priv_net, pub_net, UUID, no_odirect,
+                                         template_mode, state, affinity)
+        if commit:
+            self.commit()
+        return res
+
+    # }}}
+    # {{{ Add nodes
+
+    @_modifies_config
+    def add_nodes(self, specs, commit = True):
+        """
+        Adds multiple nodes at once. 'specs' is a list of dicts containing the arguments
+        of 'add_node()' for each node (e. g. {'priv_net' : '10.10.10.x/24'}). The IDs of all
+        nodes (if not given) are allocated in a single pass, starting after the max. existing
+        ID, and EXAConf is only written once. If one of the nodes is invalid, none of them
+        is added (also if 'commit' is False).
+
+        Returns a list of (ID, name, UUID) tuples.
+        """
+
+        used_ids = set(int(nid) for nid in self.get_section_index()["types"].get("Node", []) if nid.isdigit())
+        for spec in specs:
+            if spec.get("nid") is not None:
+                if int(spec["nid"]) in used_ids:
+                    raise EXAConfError("Node with ID %s already exists!" % str(spec["nid"]))
+                used_ids.add(int(spec["nid"]))
+        next_id = max([int(self.max_reserved_node_id)] + list(used_ids)) + 1
+
+        res = []
+        # no node is added if one of them is invalid (changes are reverted)
+        # -> the transaction only commits if 'self.commit()' is called within it
+        with self.transaction():
+            for spec in specs:
+                spec = dict(spec)
+                node_id = spec.pop("nid", None)
+                if node_id is None:
+                    node_id = next_id
+                    next_id += 1
+                node_id = int(node_id)
+                name = spec.pop("name", None)
+                res.append(self.__create_node_section(node_id, name if name is not None else "n" + str(node_id),
+                                                      spec.pop("priv_net", None), **spec))
+            if commit:
+                self.commit()
+        return res
+
+    # }}}
+    # {{{ Create node section
+
+    def __create_node_section(self, node_id, node_name, priv_net, pub_net = None, UUID = None, no_odirect = False,
+                              template_mode = False, state = None, affinity = None):
+        """
+        Creates the section for a new node with the given ID and name (without any checks of the ID).
+        """
+
         # sanity checks
         if priv_net is None:
             raise EXAConfError("The private network has to be specified when adding a node!")
@@ -1526,13 +2468,12 @@ class EXAConf(object):
         #comments
         self.config.comments[node_sec_name] = ["\n"]
 
-        if commit:
-            self.commit()
         return (node_id, node_name, node_sec["UUID"])
 
     # }}}
     # {{{ Set node conf
 
+    @_modifies_config
     def set_node_conf(self, node_conf, node_id, remove_disks=False, commit=True):
         """
         Changes the values of the given keys for the given node (or all nodes).
@@ -1620,6 +2561,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove node
 
+    @_modifies_config
     def remove_node(self, nid, force  = False, commit = True):
         """
         Removes the given node from the EXAConf if it is not part of an EXAStorage volume
@@ -1644,6 +2586,7 @@ class EXAConf(object):
 
     # {{{ Add volume
 
+    @_modifies_config
     def add_volume(self, name, vol_type, size, disk, redundancy, nodes, owner,
                    num_master_nodes = None, permissions = None, labels = None,
                    block_size = None,  stripe_size = None, shared = None,
@@ -1731,6 +2674,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add remote volume
 
+    @_modifies_config
     def add_remote_volume(self, vol_type, url, owner, remote_volume_name = None, remote_volume_id = None,
                           labels = None, username = None, password = None,
                           options = None, commit = True):
@@ -1793,6 +2737,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add object volume
 
+    @_modifies_config
     def add_object_volume(self, name, vol_type,
                           bucket, owner, region,
                           prefix = None,
@@ -1861,6 +2806,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove volume
 
+    @_modifies_config
     def remove_volume(self, name, force = False, commit = True):
         """
         Removes the given volume from the EXAConf if it is not used by a database
@@ -1884,6 +2830,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove object volume
 
+    @_modifies_config
     def remove_object_volume(self, name, force = False, commit = True):
         """
         Removes the given volume from the EXAConf if it is not used by a database
@@ -1907,6 +2854,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove remote volume
 
+    @_modifies_config
     def remove_remote_volume(self, remote_volume_name=None, remote_volume_id=None, force = False, commit = True):
         """
         Removes the given remote volume from the EXAConf if it is not used by a database
@@ -1935,6 +2883,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set volume conf
 
+    @_modifies_config
     def set_volume_conf(self, vol_conf, vol_name, commit=True):
         """
         Changes the values of the given keys for the given volume
@@ -2007,6 +2956,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set volume conf
 
+    @_modifies_config
     def set_object_volume_conf(self, vol_conf, vol_name, commit=True):
         """
         Changes the values of the given keys for the given volume
@@ -2066,6 +3016,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set remote volume conf
 
+    @_modifies_config
     def set_remote_volume_conf(self, vol_conf, vname):
         """
         Changes the values of the given keys for the given remote volumes
@@ -2116,6 +3067,7 @@ class EXAConf(object):
 
     # {{{ Add database
 
+    @_modifies_config
     def add_database(self, name, version, mem_size, port, owner, nodes, num_active_nodes, data_volume,
                      cloud_data_volume = None, params = None, ldap_servers = None,
                      cache_volume_disk = None, enable_auditing = None, interfaces = None,
@@ -2219,6 +3171,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove database
 
+    @_modifies_config
     def remove_database(self, name, commit = True):
         """
         Remove the given database from EXAConf.
@@ -2236,6 +3189,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set database conf
 
+    @_modifies_config
     def set_database_conf(self, db_conf, db_name, commit=True):
         """
         Changes the values of the given keys for the given database
@@ -2337,6 +3291,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add backup schedule
 
+    @_modifies_config
     def add_backup_schedule(self, db_name, backup_name, volume, level, minute, hour, day, month, weekday,
                             expire = 0, enabled = True, commit = True):
         """
@@ -2371,6 +3326,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove backup schedule
 
+    @_modifies_config
     def remove_backup_schedule(self, db_name, backup_name, commit = True):
         """
         Remove an existing backup schedule from the given database.
@@ -2393,6 +3349,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set backup schedule conf
 
+    @_modifies_config
     def set_backup_schedule_conf(self, backup_conf, db_name, backup_name, commit = True):
         """
         Changes the values of the given keys in the given backup section.
@@ -2440,6 +3397,7 @@ class EXAConf(object):
 
     # {{{ Add BucketFS
 
+    @_modifies_config
     def add_bucketfs(self, bucketfs_name, owner,
                      http_port, https_port, 
                      mode = 'rsync',
@@ -2483,6 +3441,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set BucketFS conf
 
+    @_modifies_config
     def set_bucketfs_conf(self, bfs_conf, bucketfs_name, commit = True):
         """
         Changes the values of the given keys in the given BucketFS section.
@@ -2520,6 +3479,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove BucketFS
 
+    @_modifies_config
     def remove_bucketfs(self, bucketfs_name, commit = True):
         """
         Remove the given BucketFS from EXAConf.
@@ -2536,6 +3496,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add Bucket
 
+    @_modifies_config
     def add_bucket(self, bucket_name, bucketfs_name, public,
                    read_password = None, write_password = None,
                    additional_files = None, commit = True):
@@ -2562,6 +3523,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set Bucket conf
 
+    @_modifies_config
     def set_bucket_conf(self, b_conf, bucket_name, bucketfs_name, commit = True):
         """
         Changes the values of the given keys in the given Bucket section.
@@ -2599,6 +3561,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove Bucket
 
+    @_modifies_config
     def remove_bucket(self, bucket_name, bucketfs_name, commit = True):
         """
         Remove the given Bucket from the given BucketFS.
@@ -2619,6 +3582,7 @@ class EXAConf(object):
 
     # {{{ Add user
 
+    @_modifies_config
     def add_user(self, username, userid, group, login_enabled,
                  password = None, encode_passwd = False,
                  additional_groups = None, authorized_keys = None,
@@ -2667,6 +3631,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set user conf
 
+    @_modifies_config
     def set_user_conf(self, user_conf, username, encode_passwd = False, extend_groups = False, extend_keys = False):
         """
         Changes the values of the given keys for the given user (or all users).
@@ -2714,6 +3679,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove user
 
+    @_modifies_config
     def remove_user(self, username, commit = True):
         """
         Removes the given user from EXAConf.
@@ -2731,6 +3697,7 @@ class EXAConf(object):
 
     # {{{ Add group
 
+    @_modifies_config
     def add_group(self, groupname, groupid,
                   commit = True):
         """
@@ -2760,6 +3727,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set group conf
 
+    @_modifies_config
     def set_group_conf(self, group_conf, group_name):
         """
         Changes the values of the given keys for the given group (or all groups).
@@ -2788,6 +3756,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove group
 
+    @_modifies_config
     def remove_group(self, groupname, commit = True):
         """
         Removes the given group from EXAConf.
@@ -2805,6 +3774,7 @@ class EXAConf(object):
 
     # {{{ Add missing users and groups
 
+    @_modifies_config
     def add_missing_users_and_groups(self):
         """
         Checks all existing owners and adds corresponding users and groups if they are missing.
@@ -2849,6 +3819,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add default users
 
+    @_modifies_config
     def add_default_users(self, exadefuid=None):
         """
         Adds the default user entries to EXAConf. You can specify the UID of the default user with 'exadefuid'.
@@ -2874,6 +3845,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add default groups
 
+    @_modifies_config
     def add_default_groups(self, exadefgid=None):
         """
         Adds the default group entries to EXAConf. You can specify the GID of the 'exausers' group with 'exadefgid'.
@@ -2905,6 +3877,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add Logging
 
+    @_modifies_config
     def add_Logging(self, LogRotationTypes = ['local'],
                     RemoteLogRotationVolume = None,
                     RemoteLogRotationPrefix = None,
@@ -2952,6 +3925,7 @@ class EXAConf(object):
     # }}}
     # {{{ Merge EXAConf
 
+    @_modifies_config
     def merge_exaconfs(self, exaconf_list, allow_self=False, force=False):
         """
         Merges the changes in the given list of EXAConf instances into this one.
@@ -2968,42 +3942,77 @@ class EXAConf(object):
         EXAConf is always copied to the external one during shutdown.
         """
 
-        ref_exaconf = None
+        candidates = [ (exaconf, exaconf.get_revision()) for exaconf in exaconf_list ]
+        uuid_maps = [ odict((nid, node.uuid) for nid, node in exaconf.get_nodes().items()) for exaconf in exaconf_list ]
+        self.__merge(candidates, uuid_maps, allow_self, force, lambda exaconf: exaconf)
+
+    # }}}
+    # {{{ Merge EXAConf files
+
+    @_modifies_config
+    def merge_exaconf_files(self, filenames, allow_self=False, force=False, summaries=None):
+        """
+        Merges the given EXAConf files into this instance (see 'merge_exaconfs()'). Only the
+        revisions and node UUIDs of the files are read (see 'read_exaconf_summary()'), so only
+        the selected reference is actually parsed. 'summaries' may contain the already read
+        summaries of the given files. The reference is read without cache and journal, so no
+        additional files are created next to it (e. g. within the node volumes).
+        """
+
+        if summaries is None:
+            summaries = [ read_exaconf_summary(f) for f in filenames ]
+        candidates = [ (f, summary.revision) for f, summary in zip(filenames, summaries) ]
+        uuid_maps = [ summary.node_uuids for summary in summaries ]
+        self.__merge(candidates, uuid_maps, allow_self, force,
+                     lambda f: EXAConf(os.path.dirname(f), True, filename = os.path.basename(f),
+                                       use_cache = False, journal = False))
+
+    # }}}
+    # {{{ Merge
+
+    def __merge(self, candidates, uuid_maps, allow_self, force, load):
+        """
+        Implements 'merge_exaconfs()' for the given list of (candidate, revision) tuples and node UUID
+        maps. 'load' is called for the selected candidate and has to return an EXAConf instance.
+        """
+
+        ref_candidate = None
         if allow_self is True:
-            ref_exaconf = self
+            ref_candidate = self
         # init 'max_rev' with 0 if the merge should be forced
         max_rev = self.get_revision() if force is False else 0
-        for exaconf in exaconf_list:
-            curr_rev = exaconf.get_revision()
+        for candidate, curr_rev in candidates:
             # test for '>=' if 'allow_self' is False in order
             # to always select a reference
             # -> except if all others are '<' (see below)
             if (allow_self is True and curr_rev > max_rev) or \
                (allow_self is False and curr_rev >= max_rev):
                 max_rev = curr_rev
-                ref_exaconf = exaconf
+                ref_candidate = candidate
 
         # This can only happen if 'allow_self' and 'force' are False but the current instance has the highest revision.
         # That case has to be fixed manually.
-        if ref_exaconf is None:
+        if ref_candidate is None:
             raise EXAConfError("Failed to select a reference for EXAConf merge (no one has a revision >= '%i'). This conflict has to be fixed manually!"
                                % self.get_revision())
 
-        # copy selected reference by overwriting and reloading
-        # the config file of the current one
-        if ref_exaconf != self:
-            ref_exaconf.write_copy(self.get_conf_path())
-            self.config.reload()
+        # apply the changes of the selected reference to the current one
+        # --> only changed keys are modified and the file is only written if the content has changed
+        if ref_candidate is not self:
+            ref_exaconf = load(ref_candidate)
+            self.apply_delta(self.diff(ref_exaconf), force = True, commit = False)
+            self.config["Global"]["Revision"] = str(ref_exaconf.get_revision())
+            self.config["Global"]["Checksum"] = ref_exaconf.get_checksum()
 
-        self.__merge_node_uuids(exaconf_list)
+        self.__merge_node_uuids(uuid_maps)
         self.commit()
 
     # }}}
     # {{{ Merge node UUIDs
 
-    def __merge_node_uuids(self, exaconf_list):
+    def __merge_node_uuids(self, uuid_maps):
         """
-        Merges the node UUIDs of the EXAConf instances in the given list into this EXAConf instance.
+        Merges the node UUIDs of the given maps (node ID -> UUID, one per EXAConf) into this EXAConf instance.
         Done by replacing all UUIDs with value "IMPORT" in this instance with the UUID of the same
         node in another instance (if that UUID is not "IMPORT").
 
@@ -3014,21 +4023,53 @@ class EXAConf(object):
             if self.is_node(section):
                 node_sec = self.config[section]
                 nid = self.get_section_id(section)
-                for exaconf in exaconf_list:
-                    other_nodes = exaconf.get_nodes()
-                    if nid in other_nodes:
-                        other_node = other_nodes[nid]
+                for other_uuids in uuid_maps:
+                    if nid in other_uuids:
+                        other_uuid = other_uuids[nid]
                         # a.) copy UUID from other node
-                        if node_sec["UUID"] == "IMPORT" and other_node.uuid != "IMPORT":
-                            node_sec["UUID"] = other_node.uuid
+                        if node_sec["UUID"] == "IMPORT" and other_uuid != "IMPORT":
+                            node_sec["UUID"] = other_uuid
                         # b.) compare UUIDs
-                        elif node_sec["UUID"] != "IMPORT" and other_node.uuid != "IMPORT":
-                            if node_sec["UUID"] != other_node.uuid:
-                                raise EXAConfError("Node %s has different UUIDs: '%s' (current) and '%s' (other)." % (nid, node_sec["UUID"], other_node.uuid))
+                        elif node_sec["UUID"] != "IMPORT" and other_uuid != "IMPORT":
+                            if node_sec["UUID"] != other_uuid:
+                                raise EXAConfError("Node %s has different UUIDs: '%s' (current) and '%s' (other)." % (nid, node_sec["UUID"], other_uuid))
+
+    # }}}
+    # {{{ Diff
+
+    def diff(self, other):
+        """
+        Returns the delta between this EXAConf and the given one (i. e. the operations
+        that transform this EXAConf into the other one, see 'diff_configs()').
+        """
+        for exaconf in (self, other):
+            if exaconf.has_runtime_values():
+                exaconf.normalize_runtime_values()
+        return diff_configs(self.config, other.config)
+
+    # }}}
+    # {{{ Apply delta
+
+    @_modifies_config
+    def apply_delta(self, delta, force = False, commit = True):
+        """
+        Applies the given delta (see 'diff()') to this EXAConf. Raises an EXAConfConflictError
+        (and applies nothing) if an operation conflicts with the current content, unless 'force'
+        is True. Returns the nr. of applied operations.
+        """
+        with self.transaction():
+            applied, conflicts = apply_config_delta(self.config, delta, force = force)
+            if len(conflicts) > 0 and not force:
+                raise EXAConfConflictError("Failed to apply delta because of %i conflict(s): %s" % (len(conflicts), "; ".join(conflicts)),
+                                           conflicts)
+            if commit:
+                self.commit()
+        return applied
 
     # }}}
     # {{{ Set timezone
 
+    @_modifies_config
     def set_timezone(self, tz):
         """
         Set the system timezone to the given string.
@@ -3040,6 +4081,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set C4 socket path
 
+    @_modifies_config
     def set_c4socket(self, c4socket):
         """
         Set the c4 socket path to the given string.
@@ -3049,6 +4091,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set global thresholds
 
+    @_modifies_config
     def set_global_thresholds(self, conf):
         if "license_rawmem_threshold" in conf:
             if not 0 <= conf.license_rawmem_threshold <= 100:
@@ -3058,6 +4101,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set hugepages
 
+    @_modifies_config
     def set_hugepages(self, hugepages):
         """
         Set the system hugepages to the given string.
@@ -3073,6 +4117,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set storage conf
 
+    @_modifies_config
     def set_storage_conf(self, conf):
         """
         Set the various configurable EXAStorage parameters.
@@ -3097,6 +4142,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set license file
 
+    @_modifies_config
     def set_license_file(self, license_file_path, commit = False):
         self.config["Global"]["LicenseFile"] = license_file_path
         self.license_filename = os.path.basename(license_file_path)
@@ -3106,6 +4152,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set SaaS enabled flag
 
+    @_modifies_config
     def set_saas(self, enabled, saas_db, commit = False):
         if 'SaaS' not in self.config.sections:
             self.config['SaaS'] = {}
@@ -3123,6 +4170,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set external IdentityProvider config
 
+    @_modifies_config
     def set_idp_config(self, idp_config, commit = False):
         if 'IdP' not in self.config.sections:
             self.config['IdP'] = {}
@@ -3134,6 +4182,7 @@ class EXAConf(object):
     # }}}    
     
     # {{{ Monitoring plugins: add
+    @_modifies_config
     def add_plugin (self, plugin_name: str, bucketfs_name: Optional[str] = None,
                     bucket_name: Optional[str] = None, plugin_dir: Optional[str] = None,
                     commit: Optional[bool] = False) -> None:
@@ -3152,6 +4201,7 @@ class EXAConf(object):
             raise EXAConfError (f'{plugin_name} is already in EXAConf')
     # }}}
     # {{{ Monitoring plugins: remove
+    @_modifies_config
     def remove_plugin (self, plugin_name: str, commit: Optional[bool] = False) -> None:
         if not plugin_name:
             raise EXAConfError ('Empty plugin name was given')
@@ -3198,7 +4248,7 @@ class EXAConf(object):
         """
         Extracts and returns the part behind the ':' from the given section.
         """
-        return section.split(":")[1].strip()
+        return split_section_name(section)[1]
 
     # }}}
     # {{{ Get revision
@@ -3585,13 +4635,11 @@ class EXAConf(object):
         Checks if the given volume exists and returns section name.
         """
 
-        for section in self.config.sections:
-            if self.is_volume(section) or \
-               self.is_object_volume(section) or \
-               self.is_remote_volume(section):
-                if str(name) == self.get_section_id(section):
-                    return section
-        return None
+        sections = self.get_section_index()["sections"]
+        name = str(name)
+        return sections.get(("EXAVolume", name)) or \
+               sections.get(("ObjectVolume", name)) or \
+               sections.get(("RemoteVolume", name))
 
     # }}}
     # {{{ Exa volume exists
@@ -3601,11 +4649,7 @@ class EXAConf(object):
         Checks if the given regular volume exists and returns section name.
         """
 
-        for section in self.config.sections:
-            if self.is_volume(section):
-                if str(name) == self.get_section_id(section):
-                    return section
-        return None
+        return self.get_section_index()["sections"].get(("EXAVolume", str(name)))
 
     # }}}
     # {{{ Object volume exists
@@ -3615,11 +4659,7 @@ class EXAConf(object):
         Checks if the given object volume exists and returns section name.
         """
 
-        for section in self.config.sections:
-            if self.is_object_volume(section):
-                if str(name) == self.get_section_id(section):
-                    return section
-        return None
+        return self.get_section_index()["sections"].get(("ObjectVolume", str(name)))
 
     # }}}
     # {{{ Remote volume exists
@@ -3629,11 +4669,7 @@ class EXAConf(object):
         Checks if the given remote volume exists and returns section name.
         """
 
-        for section in self.config.sections:
-            if self.is_remote_volume(section):
-                if str(name) == self.get_section_id(section):
-                    return section
-        return None
+        return self.get_section_index()["sections"].get(("RemoteVolume", str(name)))
 
     # }}}
     # {{{ Remote volume ID exists
@@ -3643,11 +4679,10 @@ class EXAConf(object):
         Checks if a remote volume with the given ID exists.
         """
 
-        for section in self.config.sections:
-            if self.is_remote_volume(section):
-                vol_sec = self.config[section]
-                if str(ID) == str(vol_sec['ID']):
-                    return True
+        index = self.get_section_index()
+        for vname in index["types"].get("RemoteVolume", []):
+            if str(ID) == str(self.config[index["sections"][("RemoteVolume", vname)]]['ID']):
+                return True
         return False
 
     # }}}
@@ -3672,11 +4707,7 @@ class EXAConf(object):
         Checks if the given database exists.
         """
 
-        for section in self.config.sections:
-            if self.is_database(section):
-                if str(name) == self.get_section_id(section):
-                    return section
-        return None
+        return self.get_section_index()["sections"].get(("DB", str(name)))
 
     # }}}
     # {{{ Database backup schedule exists
@@ -3690,8 +4721,8 @@ class EXAConf(object):
             return False
         db_sec = self.config[db_sec_name]
         for ba_sec_name in db_sec.sections:
-            ba_sec = ba_sec_name.split(':')
-            if len(ba_sec) > 1 and ba_sec[0].strip() == 'Backup' and ba_sec[1].strip() == backup_name:
+            ba_sec = split_section_name(ba_sec_name)
+            if len(ba_sec) > 1 and ba_sec[0] == 'Backup' and ba_sec[1] == backup_name:
                 return ba_sec_name
         return None
 
@@ -3702,11 +4733,7 @@ class EXAConf(object):
         """
         Returns True if a node with the given ID exists, False otherwise.
         """
-        for section in self.config.sections:
-            if self.is_node(section):
-                if str(nid) == self.get_section_id(section):
-                    return section
-        return None
+        return self.get_section_index()["sections"].get(("Node", str(nid)))
 
     # }}}
     # {{{ User exists
@@ -3785,11 +4812,7 @@ class EXAConf(object):
         Checks if the given BucketFS exists.
         """
 
-        for section in self.config.sections:
-            if self.is_bucketfs(section):
-                if str(name) == self.get_section_id(section):
-                    return section
-        return None
+        return self.get_section_index()["sections"].get(("BucketFS", str(name)))
 
     # }}}
     # {{{ bucket exists
@@ -3814,13 +4837,8 @@ class EXAConf(object):
         """
         Returns the max ID of all existing nodes or 'max_reserved_node_id' if there are none.
         """
-        max_nid = int(self.max_reserved_node_id)
-        for section in self.config.sections:
-            if self.is_node(section):
-                nid = int(self.get_section_id(section))
-                if nid > max_nid:
-                    max_nid = nid
-        return max_nid
+        index = self.get_section_index()
+        return max(int(self.max_reserved_node_id), index["max_ids"].get("Node", 0))
 
     # }}}
     # {{{ Get max remote volume id
@@ -3830,12 +4848,11 @@ class EXAConf(object):
         Returns the max ID of all existing remote volumes or 'remote_vol_id_offset' if there are none.
         """
         max_vid = self.remote_vol_id_offset
-        for section in self.config.sections:
-            if self.is_remote_volume(section):
-                vol_sec = self.config[section]
-                vid = int(vol_sec['ID'])
-                if vid > max_vid:
-                    max_vid = vid
+        index = self.get_section_index()
+        for vname in index["types"].get("RemoteVolume", []):
+            vid = int(self.config[index["sections"][("RemoteVolume", vname)]]['ID'])
+            if vid > max_vid:
+                max_vid = vid
         return max_vid
 
     # }}}
@@ -3857,6 +4874,9 @@ class EXAConf(object):
         Returns a config containing all nodes and their options within the config file.
         Options with empty values are omitted.
         """
+        return self.get_model("nodes", self.__parse_nodes)
+
+    def __parse_nodes(self):
         node_configs = config()
         for section in self.config.sections:
             if self.is_node(section):
@@ -3944,7 +4964,7 @@ class EXAConf(object):
         """
         Returns the nr. of nodes in the current EXAConf.
         """
-        return len([sec for sec in self.config.sections if self.is_node(sec)])
+        return len(self.get_section_index()["types"].get("Node", []))
 
     # }}}
     # {{{ Get storage conf
@@ -3972,6 +4992,9 @@ class EXAConf(object):
         """
         Returns configurations describing all existing EXAStorage volumes.
         """
+        return self.filter_configs(self.get_model("volumes", self.__parse_volumes), filters)
+
+    def __parse_volumes(self):
         volume_configs = config()
         for section in self.config.sections:
             if self.is_volume(section):
@@ -4021,7 +5044,7 @@ class EXAConf(object):
                         else:
                             raise EXAConfError("Found invalid volume type '%s'!" % conf.type)
                 volume_configs[vol_name] = conf
-        return self.filter_configs(volume_configs, filters)
+        return volume_configs
 
     # }}}
     # {{{ Get object volumes
@@ -4030,6 +5053,9 @@ class EXAConf(object):
         """
         Returns configurations describing all existing object volumes.
         """
+        return self.filter_configs(self.get_model("object_volumes", self.__parse_object_volumes), filters)
+
+    def __parse_object_volumes(self):
         volume_configs = config()
         for section in self.config.sections:
             if self.is_object_volume(section):
@@ -4052,7 +5078,7 @@ class EXAConf(object):
                 if "Labels" in vol_sec.scalars:
                     conf.labels = [ l.strip() for l in vol_sec["Labels"].split(",") if l.strip() != "" ]
                 volume_configs[vol_name] = conf
-        return self.filter_configs(volume_configs, filters)
+        return volume_configs
 
     # }}}
     # {{{ Get remote volumes
@@ -4061,6 +5087,9 @@ class EXAConf(object):
         """
         Returns configurations describing all existing remote volumes (SMB, S3, etc.)
         """
+        return self.filter_configs(self.get_model("remote_volumes", self.__parse_remote_volumes), filters)
+
+    def __parse_remote_volumes(self):
         volume_configs = config()
         for section in self.config.sections:
             if self.is_remote_volume(section):
@@ -4088,7 +5117,7 @@ class EXAConf(object):
                     if port_conf_name in vol_sec.scalars:
                         conf[port_var_name] = int(vol_sec[port_conf_name])
                 volume_configs[vol_name] = conf
-        return self.filter_configs(volume_configs, filters)
+        return volume_configs
 
     # }}}
     # {{{ to_remote_volume_id
@@ -4148,6 +5177,9 @@ class EXAConf(object):
         """
         Returns a config describing all existing EXASolution databases.
         """
+        return self.filter_configs(self.get_model("databases", self.__parse_databases), filters)
+
+    def __parse_databases(self):
         db_configs = config()
         for section in self.config.sections:
             if self.is_database(section):
@@ -4243,7 +5275,7 @@ class EXAConf(object):
 
                 # add current database
                 db_configs[db_name] = conf
-        return self.filter_configs(db_configs, filters)
+        return db_configs
 
     # }}}
     # {{{ Get node usage
@@ -4254,8 +5286,8 @@ class EXAConf(object):
         """
 
         result = config()
-        config.volumes = []
-        config.dbs = []
+        result.volumes = []
+        result.dbs = []
         # check volumes
         volumes = self.get_volumes()
         for v in volumes.values():
@@ -4298,6 +5330,9 @@ class EXAConf(object):
         """
         Returns a config containing entries for all bucket filesystems and their buckets.
         """
+        return self.get_model("bucketfs", self.__parse_bucketfs)
+
+    def __parse_bucketfs(self):
         bfs_config = config()
         for section in self.config.sections:
             if self.is_bucketfs(section):
@@ -4496,6 +5531,9 @@ class EXAConf(object):
         """
         Returns a config containing all users defined in EXAConf.
         """
+        return self.filter_configs(self.get_model("users", self.__parse_users), filters)
+
+    def __parse_users(self):
         user_configs = config()
         if "Users" in self.config.sections:
             for user in self.config["Users"].sections:
@@ -4511,7 +5549,7 @@ class EXAConf(object):
                 if "AuthorizedKeys" in user_sec.scalars:
                     user_conf.authorized_keys = [ k.strip() for k in user_sec["AuthorizedKeys"].split(',') if k.strip() != "" ]
                 user_configs[user] = user_conf
-        return self.filter_configs(user_configs, filters)
+        return user_configs
 
     # }}}
     # {{{ Get groups
@@ -4520,6 +5558,9 @@ class EXAConf(object):
         """
         Returns a config containing all groups defined in EXAConf.
         """
+        return self.filter_configs(self.get_model("groups", self.__parse_groups), filters)
+
+    def __parse_groups(self):
         group_configs = config()
         if "Groups" in self.config.sections:
             for group in self.config["Groups"].sections:
@@ -4527,7 +5568,7 @@ class EXAConf(object):
                 group_conf = config()
                 group_conf.id = group_sec.as_int("ID")
                 group_configs[group] = group_conf
-        return self.filter_configs(group_configs, filters)
+        return group_configs
 
     # }}}
     # {{{ To uid
@@ -4696,6 +5737,7 @@ class EXAConf(object):
 
     # {{{ Add node disk
 
+    @_modifies_config
     def add_node_disk(self, node_id, disk, component = None, devices = None, drives = None,
                       ephemeral = False, overwrite_existing = False, no_odirect = False, commit=True):
         """
@@ -4735,6 +5777,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove node disk
 
+    @_modifies_config
     def remove_node_disk(self, node_id, disk):
         """
         Removes the given storage disk (or all disks) from the given node.
@@ -4757,6 +5800,7 @@ class EXAConf(object):
     # }}}
     # {{{ Add node device
 
+    @_modifies_config
     def add_node_device(self, node_id, disk, device, path = None, commit=True):
         """
         Adds the given device to the given disk on the given node. If 'path' is specified, a mapping is also added.
@@ -4764,6 +5808,20 @@ class EXAConf(object):
         The given disk has to exist (can be created with 'add_node_disk()').
         """
 
+        self.add_node_devices(node_id, disk, [device], path, commit)
+
+    # }}}
+    # {{{ Add node devices
+
+    @_modifies_config
+    def add_node_devices(self, node_id, disk, devices, path = None, commit=True):
+        """
+        Adds all given devices to the given disk on the given node (at once). If 'path' is specified,
+        a mapping is also added for each device.
+
+        The given disk has to exist (can be created with 'add_node_disk()').
+        """
+
         nodes_conf = self.get_nodes()
         if str(node_id) not in nodes_conf:
             raise EXAConfError("Node %s does not exist in '%s'." % (node_id, self.conf_path))
@@ -4774,19 +5832,21 @@ class EXAConf(object):
         # add devices
         if "devices" not in node_disks[disk]:
             node_disks[disk].devices = []
-        elif device in node_disks[disk].devices:
-            raise EXAConfError("Disk '%s' of node %s already contains device '%s'." % (disk, str(node_id), device))
-        node_disks[disk].devices.append(device)
-        if path and path != "":
-            if "mapping" not in node_disks[disk]:
-                node_disks[disk].mapping = []
-            node_disks[disk].mapping.append((device,path))
+        for device in devices:
+            if device in node_disks[disk].devices:
+                raise EXAConfError("Disk '%s' of node %s already contains device '%s'." % (disk, str(node_id), device))
+            node_disks[disk].devices.append(device)
+            if path and path != "":
+                if "mapping" not in node_disks[disk]:
+                    node_disks[disk].mapping = []
+                node_disks[disk].mapping.append((device,path))
 
         self.set_node_conf(node_conf, node_conf.id, commit)
 
     # }}}
     # {{{ Remove node device
 
+    @_modifies_config
     def remove_node_device(self, node_id, disk, device, remove_empty_disk=True, commit=True):
         """
         Removes the given device from the node and disk. Also deletes the disk
@@ -4822,6 +5882,7 @@ class EXAConf(object):
     # }}}
     # {{{ Remove node drives
 
+    @_modifies_config
     def remove_node_drives(self, node_id, disk, drives_to_remove):
         """
         Removes given drives from the disk.
@@ -4848,6 +5909,7 @@ class EXAConf(object):
     # }}}
     # {{{ Use disk for volumes
 
+    @_modifies_config
     def use_disk_for_volumes(self, disk, bytes_per_node, vol_type=None, min_vol_size = None, vol_resize_step=None):
         """
         Adds the given disk to all volumes of the given type that don't have a disk assigned yet.
@@ -4863,28 +5925,31 @@ class EXAConf(object):
             return
         bytes_per_volume_node = bytes_per_node // len(volumes)
 
-        for volume in volumes.items():
-            vol_sec_name = self.volume_exists(volume[0])
-            if vol_sec_name is None: continue
-            vol_sec = self.config[vol_sec_name]
-            vol_sec["Disk"] = disk
-            # decrease volume size to the next multiple of the vol_resize_step (if given)
-            if vol_resize_step and vol_resize_step > 0:
-                vol_size = bytes2units((vol_resize_step * (bytes_per_volume_node // vol_resize_step)) // volume[1].redundancy)
-                if units2bytes(vol_size) < vol_resize_step:
-                    vol_size = bytes2units(vol_resize_step)
-            else:
-                vol_size = bytes2units(bytes_per_volume_node // volume[1].redundancy)
-            # check size if given
-            if min_vol_size and units2bytes(vol_size) < min_vol_size:
-                raise EXAConfError("Can't assign disk to volume because resulting size '%s' is below min. size %s!" % (vol_size, bytes2units(min_vol_size)))
-            vol_sec["Size"] = vol_size
+        # revert all volumes if one of them can't be modified
+        with self.transaction():
+            for volume in volumes.items():
+                vol_sec_name = self.volume_exists(volume[0])
+                if vol_sec_name is None: continue
+                vol_sec = self.config[vol_sec_name]
+                vol_sec["Disk"] = disk
+                # decrease volume size to the next multiple of the vol_resize_step (if given)
+                if vol_resize_step and vol_resize_step > 0:
+                    vol_size = bytes2units((vol_resize_step * (bytes_per_volume_node // vol_resize_step)) // volume[1].redundancy)
+                    if units2bytes(vol_size) < vol_resize_step:
+                        vol_size = bytes2units(vol_resize_step)
+                else:
+                    vol_size = bytes2units(bytes_per_volume_node // volume[1].redundancy)
+                # check size if given
+                if min_vol_size and units2bytes(vol_size) < min_vol_size:
+                    raise EXAConfError("Can't assign disk to volume because resulting size '%s' is below min. size %s!" % (vol_size, bytes2units(min_vol_size)))
+                vol_sec["Size"] = vol_size
 
-        self.commit()
+            self.commit()
 
     # }}}
     # {{{ Set node network
 
+    @_modifies_config
     def set_node_network(self, node_id, private=None, public=None):
         """
         Sets the private and / or public network of the given node.
@@ -4910,6 +5975,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set node network
 
+    @_modifies_config
     def set_node_ip(self, node_id, private=None, public=None):
         """
         Sets the private and / or public IP address of the given node.
@@ -4947,6 +6013,7 @@ class EXAConf(object):
     # }}}
     # {{{ Update docker image
 
+    @_modifies_config
     def update_docker_image(self, image):
         """
         Replaces the docker image for all containers of this cluster with the given one.
@@ -5028,6 +6095,7 @@ class EXAConf(object):
     # }}}
     # {{{ Set docker privileged
 
+    @_modifies_config
     def set_docker_privileged(self, enabled):
         """
         Set the flag for privileged mode to 'True' or 'False'. Can be used to signal that a container has been
@@ -5086,6 +6154,7 @@ class EXAConf(object):
             return False
 
 
+    @_modifies_config
     def set_cored_use_privileged_ports(self, activate: bool):
         self.config["Global"]["CoredUsePrivilegedPorts"] = bool(activate)
 
@@ -5097,6 +6166,7 @@ class EXAConf(object):
             return False
 
 
+    @_modifies_config
     def set_cored_allow_only_same_subnet(self, activate: bool):
         self.config["Global"]["CoredAllowOnlySameSubnet"] = bool(activate)
      
@@ -5108,5 +6178,6 @@ class EXAConf(object):
             return ""
 
 
+    @_modifies_config
     def set_cored_subnets(self, subnets: str):
         self.config["Global"]["CoredSubnets"] = subnets
@@ -0,0 +1,377 @@
+#! /usr/bin/env python3
+
+import os, json, asyncio, shlex, struct, time, math
+from urllib.parse import quote, urlencode
+import docker
+from .docker_handler import docker_handler, DockerError, output_logger, ip_types
+
+#{{{ Async parallel map
+async def async_parallel_map(func, items, max_workers = 8, stop_on_error = False):
+    """
+    Awaits 'func(item)' for all given items, with at most 'max_workers' coroutines running
+    concurrently (the asyncio counterpart of 'util.parallel_map()').
+
+    Returns a list of (item, result, exception) tuples in the order of the given items.
+    Exceptions raised by 'func' are not propagated but returned together with the item
+    ('exception' is None on success). If 'stop_on_error' is true, items that have not
+    been started when the first error occurs are skipped (and not part of the result).
+    """
+
+    items = list(items)
+    results = {}
+    semaphore = asyncio.Semaphore(max(1, max_workers))
+    stopped = False
+    async def run(num, item):
+        nonlocal stopped
+        async with semaphore:
+            if stopped:
+                return
+            try:
+                results[num] = (item, await func(item), None)
+            except Exception as e:
+                results[num] = (item, None, e)
+                if stop_on_error:
+                    stopped = True
+    await asyncio.gather(*[ run(num, item) for num, item in enumerate(items) ])
+    return [ results[num] for num in sorted(results) ]
+#}}}
+
+class engine_api_client(object):
+    """
+    Minimal asynchronous HTTP/1.1 client for the Docker Engine API (unix socket only).
+    Each request uses its own connection, so any nr. of requests can be sent concurrently.
+    """
+
+    default_socket = "/var/run/docker.sock"
+
+#{{{ Init
+    def __init__(self, socket_path=None, version=None, timeout=120):
+        """
+        Creates a client for the given socket (default: taken from 'DOCKER_HOST' or '/var/run/docker.sock').
+        If 'version' is None, the API version of the docker service is used (see 'get_version()').
+        'timeout' is the default timeout (in seconds) for a single request.
+        """
+        if socket_path is None:
+            docker_host = os.environ.get("DOCKER_HOST", "")
+            if docker_host == "":
+                socket_path = self.default_socket
+            elif docker_host.startswith("unix://"):
+                socket_path = docker_host[len("unix://"):]
+            else:
+                raise DockerError("Only unix sockets are supported by the asynchronous client (DOCKER_HOST is '%s')!" % docker_host)
+        self.socket_path = socket_path
+        self.version = version
+        self.timeout = timeout
+#}}}
+
+#{{{ Get version
+    async def get_version(self):
+        """
+        Returns the API version (determined on first call).
+        """
+        if self.version is None:
+            self.version = (await self.request("GET", "/version", versioned = False))["ApiVersion"]
+        return self.version
+#}}}
+
+#{{{ Request
+    async def request(self, method, path, params=None, body=None, stream=None, timeout=None, versioned=True):
+        """
+        Sends the given request and returns the decoded JSON response (or None if it's empty).
+        If 'stream' is given, the connection is upgraded (like for 'docker exec') and all received
+        data is passed to 'stream()' until the connection is closed by the docker service.
+
+        Raises a DockerError if the request fails.
+        """
+        if versioned:
+            path = "/v%s%s" % (await self.get_version(), path)
+        if params:
+            path += "?" + urlencode([ (k, int(v) if isinstance(v, bool) else v) for k, v in params.items() if v is not None ])
+        try:
+            return await asyncio.wait_for(self.__request(method, path, body, stream),
+                                          timeout if timeout is not None else self.timeout)
+        except asyncio.TimeoutError:
+            raise DockerError("Request '%s %s' timed out!" % (method, path))
+        except (OSError, EOFError, ValueError) as e:
+            raise DockerError("Request '%s %s' failed: %s" % (method, path, e))
+
+    async def __request(self, method, path, body, stream):
+        data = json.dumps(body).encode() if body is not None else b""
+        headers = ["%s %s HTTP/1.1" % (method, path),
+                   "Host: docker",
+                   "Content-Length: %i" % len(data)]
+        if body is not None:
+            headers.append("Content-Type: application/json")
+        if stream is not None:
+            headers += ["Connection: Upgrade", "Upgrade: tcp"]
+        else:
+            headers.append("Connection: close")
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        try:
+            writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + data)
+            await writer.drain()
+            # status line and headers
+            status = int((await reader.readline()).split()[1])
+            resp_headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if line == "":
+                    break
+                key, value = line.split(":", 1)
+                resp_headers[key.strip().lower()] = value.strip()
+            # body
+            if stream is not None and status in (101, 200):
+                while True:
+                    chunk = await reader.read(65536)
+                    if not chunk:
+                        return None
+                    stream(chunk)
+            if resp_headers.get("transfer-encoding", "").lower() == "chunked":
+                content = b""
+                while True:
+                    size = int((await reader.readline()).split(b";")[0], 16)
+                    if size == 0:
+                        break
+                    content += await reader.readexactly(size)
+                    await reader.readline()
+            elif "content-length" in resp_headers:
+                content = await reader.readexactly(int(resp_headers["content-length"]))
+            else:
+                content = await reader.read()
+        finally:
+            writer.close()
+        if status >= 400:
+            try:
+                message = json.loads(content.decode())["message"]
+            except (ValueError, KeyError, TypeError):
+                message = content.decode(errors = "replace").strip()
+            raise DockerError("%s (status %i)" % (message, status))
+        return json.loads(content.decode()) if content.strip() != b"" else None
+#}}}
+
+#{{{ Demultiplexer
+def demultiplexer(output):
+    """
+    Returns a function that splits the multiplexed stream of a 'docker exec' without TTY (frames with
+    an 8 byte header containing the stream type and size) and passes the payload to 'output()'.
+    """
+    buf = bytearray()
+    def feed(data):
+        buf.extend(data)
+        while len(buf) >= 8:
+            size = struct.unpack(">I", bytes(buf[4:8]))[0]
+            if len(buf) < 8 + size:
+                break
+            output(bytes(buf[8:8 + size]))
+            del buf[:8 + size]
+    return feed
+#}}}
+
+class async_docker_handler(object):
+    """
+    Implements the container operations of 'docker_handler' using asyncio, i. e. cluster-wide operations
+    are executed concurrently without threads. Communicates with the docker service through the
+    Engine API (see 'engine_api_client'). The methods have the same arguments and results as the
+    ones of 'docker_handler' (but are coroutines):
+
+        adh = async_docker_handler()
+        adh.set_exaconf(exaconf)
+        containers = asyncio.run(adh.create_containers())
+
+    The configuration of the containers is created by 'docker_handler' (see 'prepare_containers()').
+    """
+
+#{{{ Init
+    def __init__(self, verbose=False, quiet=False, parallel=None, socket_path=None):
+        """
+        Creates a new async_docker_handler. 'parallel' is the max. nr. of containers that are
+        processed concurrently and 'socket_path' the path of the docker socket (see 'engine_api_client').
+        """
+        self.dh = docker_handler(verbose = verbose, quiet = quiet, parallel = parallel)
+        self.api = engine_api_client(socket_path)
+        self.parallel = self.dh.parallel
+        self.verbose = self.dh.verbose
+#}}}
+
+#{{{ Set EXAConf object for this instace of async-docker-handler
+    def set_exaconf(self, exaconf):
+        """
+        Set EXAConf instance for this async_docker_handler instance.
+        """
+        self.dh.set_exaconf(exaconf)
+        self.exaconf = exaconf
+        self.cluster_name = self.dh.cluster_name
+        self.image = self.dh.image
+#}}}
+
+#{{{ Get containers
+    async def get_containers(self, all=True):
+        """
+        Returns a list of all containers of the current cluster (only running ones if all==False).
+        They are identified using the 'ClusterName' label.
+        """
+        try:
+            containers = await self.api.request("GET", "/containers/json",
+                                                params = {'all' : True,
+                                                          'filters' : json.dumps({'label' : ['ClusterName=' + self.cluster_name]})})
+        except DockerError as e:
+            raise DockerError("Failed to query containers for cluster '%s': %s" % (self.cluster_name, e.msg[len(e.prefix):]))
+        if not all:
+            containers = [ c for c in containers if c['State'] in ('running', 'paused', 'restarting') ]
+        return containers
+#}}}
+
+#{{{ Create containers
+    async def create_containers(self, networks=None, cmd=None, auto_remove=False):
+        """
+        Creates one container per node (see 'docker_handler.create_containers()'). Up to 'self.parallel'
+        containers are created concurrently.
+
+        Returns a list of created containers.
+        """
+        version = await self.api.get_version()
+        container_confs, networks, cmd = self.dh.prepare_containers(networks, cmd, auto_remove, version = version)
+        results = await async_parallel_map(lambda cc: self.create_container(cc, networks, cmd), container_confs,
+                                           max_workers = self.parallel, stop_on_error = True)
+        errors = [ (cc['name'], e) for cc, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to create %i container(s): %s" % (len(errors), self.dh.format_errors(errors)))
+        return [ res for cc, res, e in results ]
+#}}}
+
+#{{{ Create container
+    async def create_container(self, container_conf, networks, cmd):
+        """
+        Creates a single container and attaches it to the given networks (see 'docker_handler.create_container()').
+
+        Returns the created container.
+        """
+        version = await self.api.get_version()
+        args = self.dh.container_create_args(container_conf, cmd)
+        container_name = args.pop('name')
+        my_conf = container_conf['node_conf']
+        config = docker.types.ContainerConfig(version, self.image, None, **args)
+        try:
+            container = await self.api.request("POST", "/containers/create", params = {'name' : container_name},
+                                               body = { k : v for k, v in config.items() if v is not None })
+        except DockerError as e:
+            raise DockerError("Failed to create container: %s" % e.msg[len(e.prefix):])
+        container['MyName'] = container_name
+        self.dh.log("Created container '%s'." % container_name)
+
+        # attach container to the remaining network(s)
+        for net in (networks or []):
+            ip = ""
+            if net['MyScope'] == 'private':
+                ip = my_conf.private_ip
+            elif net['MyScope'] == 'public':
+                ip = my_conf.public_ip
+            try:
+                await self.api.request("POST", "/networks/%s/connect" % quote(net['Id']),
+                                       body = {'Container' : container['Id'],
+                                               'EndpointConfig' : docker.types.EndpointConfig(version, **{ip_types[self.exaconf.ip_type(ip)]: ip})})
+            except DockerError as e:
+                raise DockerError("Failed to connect network: %s" % e.msg[len(e.prefix):])
+            self.dh.log("Connected container '%s' to network '%s' with IP '%s'." % (container_name, net['MyName'], ip))
+        return container
+#}}}
+
+#{{{ Start containers
+    async def start_containers(self, containers):
+        """
+        Starts all given containers (concurrently).
+        """
+
+        async def start_container(container):
+            try:
+                await self.api.request("POST", "/containers/%s/start" % quote(container['Id']))
+            except DockerError as e:
+                raise DockerError("Failed to start container: %s" % e.msg[len(e.prefix):])
+            self.dh.log("Started container '%s'." % container['MyName'])
+            return container
+
+        results = await async_parallel_map(start_container, containers, max_workers = self.parallel)
+        errors = [ (c['MyName'], e) for c, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to start %i container(s): %s" % (len(errors), self.dh.format_errors(errors)))
+        return [ res for c, res, e in results ]
+#}}}
+
+#{{{ Stop container
+    async def stop_container(self, container, deadline):
+        """
+        Stops the given container (if it's running). If it doesn't terminate before the given deadline
+        (see 'time.monotonic()'), it's killed.
+
+        Returns True if the container has been stopped, False if it was not running.
+        """
+        if container['State'] not in ('running', 'paused', 'restarting'):
+            return False
+        timeout = max(0, int(math.ceil(deadline - time.monotonic())))
+        try:
+            await self.api.request("POST", "/containers/%s/stop" % quote(container['Id']), params = {'t' : timeout},
+                                   timeout = timeout + self.api.timeout)
+        except DockerError as e:
+            raise DockerError("Failed to stop container: %s" % e.msg[len(e.prefix):])
+        container['State'] = 'exited'
+        self.dh.log("Stopped container '%s'." % self.dh.container_name(container))
+        return True
+#}}}
+
+#{{{ Stop containers
+    async def stop_containers(self, timeout):
+        """
+        Stops all running containers from the current cluster (concurrently, i. e. the timeout applies
+        to the whole cluster, see 'docker_handler.stop_containers()').
+        """
+        containers = await self.get_containers()
+        if len(containers) == 0:
+            self.dh.log("No containers found for cluster '%s'." % self.cluster_name)
+            return False
+
+        deadline = time.monotonic() + int(timeout)
+        results = await async_parallel_map(lambda c: self.stop_container(c, deadline), containers, max_workers = len(containers))
+        errors = [ (self.dh.container_name(c), e) for c, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to stop %i container(s): %s" % (len(errors), self.dh.format_errors(errors)))
+        num_running = len([ res for c, res, e in results if res is True ])
+        if num_running == 0:
+            self.dh.log("No running containers found for cluster '%s'." % self.cluster_name)
+        elif self.verbose:
+            print("Successfully stopped %i containers." % num_running)
+        return True
+#}}}
+
+#{{{ Execute container
+    async def execute_container(self, cmd, container, stdin=False, tty=False, quiet=False, prefix=None):
+        """
+        Executes the given command in the given container (see 'docker_handler.execute_container()').
+
+        Returns the exit code of the command.
+        """
+        node_name = self.dh.node_name(container)
+        if not quiet:
+            self.dh.log("=== Executing '%s' in container '%s' ===" % (cmd, node_name))
+        try:
+            exi = await self.api.request("POST", "/containers/%s/exec" % quote(container['Id']),
+                                         body = {'AttachStdin' : stdin,
+                                                 'AttachStdout' : True,
+                                                 'AttachStderr' : True,
+                                                 'Tty' : tty,
+                                                 'Privileged' : False,
+                                                 'Cmd' : shlex.split(cmd) if isinstance(cmd, str) else cmd})
+        except DockerError as e:
+            raise DockerError("Failed to create exec instance for command '%s': %s" % (cmd, e.msg[len(e.prefix):]))
+        output = output_logger(self.dh.log, prefix)
+        try:
+            # the output is multiplexed (stdout / stderr) if the exec instance has no TTY
+            await self.api.request("POST", "/exec/%s/start" % quote(exi['Id']), body = {'Detach' : False, 'Tty' : tty},
+                                   stream = output.write if tty else demultiplexer(output.write), timeout = 0x7fffffff)
+        except DockerError as e:
+            raise DockerError("Failed to start exec instance for command '%s': %s" % (cmd, e.msg[len(e.prefix):]))
+        output.close()
+        try:
+            return (await self.api.request("GET", "/exec/%s/json" % quote(exi['Id'])))['ExitCode']
+        except DockerError as e:
+            raise DockerError("Failed to inspect exec instance for command '%s': %s" % (cmd, e.msg[len(e.prefix):]))
+#}}}
@@ -1,14 +1,16 @@
 #! /usr/bin/env python3
 
-import os
+import os, re
+from math import gcd
 from . import EXAConf
-from .util import bytes2units
+from .util import bytes2units, parallel_map
 from collections import OrderedDict as odict
 
 #{{{ Class DeviceError
 class DeviceError(Exception):
+    prefix = "ERROR::DeviceHandler: "
     def __init__(self, msg):
-        self.msg = "ERROR::DeviceHandler: " + msg
+        self.msg = self.prefix + msg
     def __str__(self):
         return repr(self.msg)
 #}}}
@@ -19,8 +21,10 @@ class device_handler(object):
     """
 
 #{{{ Init
-    def __init__(self, ec):
+    def __init__(self, ec, parallel=8):
         self.exaconf = ec
+        # max. nr. of device files that are created concurrently
+        self.parallel = parallel
         self.min_auto_free_space = (1024 * 1024 * 1024 * 10)
         self.max_auto_used_space = self.min_auto_free_space * 5
         self.max_auto_internal_used_space = (1024 * 1024 * 1024 * 6)
@@ -33,6 +37,36 @@ class device_handler(object):
         self.def_disk_name   = "disk1"
         self.auto_min_vol_size = (4 * 1024 * 1024 * 1024)
         self.vol_resize_step = (4 * 1024 * 1024 * 1024)
+        # supported allocation modes of device files
+        self.allocation_modes = ("sparse", "fallocate", "zero")
+        # chunk size used for writing zeros (allocation mode 'zero')
+        self.zero_chunk_size = (4 * 1024 * 1024)
+        # mount-points of all filesystems (see 'get_mounts()')
+        self.mountinfo_file = "/proc/self/mountinfo"
+        self.mounts = None
+#}}}
+
+#{{{ Get mounts
+    def get_mounts(self):
+        """
+        Returns the mount-points of all mounted filesystems (parsed from '/proc/self/mountinfo'),
+        sorted by descending length (i. e. the first matching prefix is the most specific one).
+        Returns None if the mountinfo file is not available. The result is cached.
+        """
+
+        if self.mounts is None:
+            try:
+                with open(self.mountinfo_file) as f:
+                    mounts = set()
+                    for line in f:
+                        fields = line.split()
+                        if len(fields) > 4:
+                            # octal escapes are used for spaces, tabs, newlines and backslashes
+                            mounts.add(re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)), fields[4]))
+            except (IOError, OSError):
+                return None
+            self.mounts = sorted(mounts, key=len, reverse=True)
+        return self.mounts
 #}}}
 
 #{{{ Get mount point
@@ -41,6 +75,12 @@ class device_handler(object):
         Returns the mount-point of the filesystem the given device belongs to.
         """
         path = os.path.realpath(os.path.abspath(path))
+        mounts = self.get_mounts()
+        if mounts is not None:
+            for mount_point in mounts:
+                if path == mount_point or path.startswith(mount_point.rstrip(os.path.sep) + os.path.sep):
+                    return mount_point
+        # fallback if mountinfo is not available
         while path != os.path.sep:
             if os.path.ismount(path):
                 return path
@@ -84,24 +124,18 @@ class device_handler(object):
         return False
 #}}}
 
-#{{{ Check free space
-    def check_free_space(self):
+#{{{ Get device files
+    def get_device_files(self):
         """
-        Checks if the sum of the size of all sparse files is bigger
-        than the free space on the associated device.
+        Returns the paths of all file-devices in EXAConf (incl. mapped devices).
         """
 
         devices = set()
-        mount_devices = odict()
         try:
             nodes_conf = self.exaconf.get_nodes()
-            docker_conf = self.exaconf.get_docker_conf()
         except EXAConf.EXAConfError as e:
             raise DeviceError("Unable to read EXAConf: %s" % e)
 
-        if docker_conf.device_type != "file":
-            raise DeviceError("Space-check is only supported for file-devices!")
-
         # extract all file-devices from the given EXAConf
         for node_id in nodes_conf:
             my_conf = nodes_conf[node_id]
@@ -122,21 +156,87 @@ class device_handler(object):
                         compat_files = self.exaconf.check_fix_local_dev_path(dev_file)
                         for f in compat_files:
                             devices.add(f)
+        return sorted(devices)
+#}}}
+
+#{{{ Get device usage
+    def get_device_usage(self, dev):
+        """
+        Returns a tuple of the logical size, the allocated bytes and the remaining growth
+        potential (i. e. the bytes that may still be allocated) of the given device file.
+        """
 
-        # organize devices according to their filesystem
-        for dev in devices:
+        try:
+            stat = os.stat(os.path.realpath(dev))
+        except OSError as e:
+            raise DeviceError("Unable to access device file '%s': %s" % (dev, e))
+        logical = stat.st_size
+        allocated = stat.st_blocks * 512
+        # allocated blocks may exceed the logical size (e. g. preallocated tail blocks)
+        return (logical, allocated, max(0, logical - allocated))
+#}}}
+
+#{{{ Get space usage
+    def get_space_usage(self):
+        """
+        Returns the space usage of all file-devices, accumulated per mount-point. Each entry
+        contains the nr. of devices, their logical size, the allocated bytes, the growth potential
+        and the free space of the filesystem.
+        """
+
+        try:
+            docker_conf = self.exaconf.get_docker_conf()
+        except EXAConf.EXAConfError as e:
+            raise DeviceError("Unable to read EXAConf: %s" % e)
+
+        if docker_conf.device_type != "file":
+            raise DeviceError("Space-check is only supported for file-devices!")
+
+        # stat all devices concurrently (may be slow on network filesystems)
+        results = parallel_map(self.get_device_usage, self.get_device_files(), max_workers = self.parallel)
+        for dev, res, e in results:
+            if e is not None:
+                raise e
+        # organize devices according to their filesystem (one statvfs per filesystem)
+        usage = odict()
+        for dev, (logical, allocated, growth), e in results:
             mount_point = self.get_mount_point(dev)
-            if mount_point not in mount_devices:
-                mount_devices[mount_point] = []
-            mount_devices[mount_point].append(dev)
-        # compute free space for each mountpoint
+            if mount_point not in usage:
+                usage[mount_point] = odict([("devices", 0), ("logical", 0), ("allocated", 0), ("growth", 0),
+                                            ("free", self.get_free_space(mount_point))])
+            entry = usage[mount_point]
+            entry["devices"] += 1
+            entry["logical"] += logical
+            entry["allocated"] += allocated
+            entry["growth"] += growth
+        return usage
+#}}}
+
+#{{{ Check free space
+    def check_free_space(self, quiet = False):
+        """
+        Checks if the remaining growth potential of all file-devices (i. e. the bytes that are not
+        allocated yet) exceeds the free space on the associated filesystem. Blocks that are already
+        allocated (by previous writes or preallocation) don't need any more space.
+
+        Prints a table with the space usage per mount-point (unless 'quiet' is true) and returns
+        False if there is not enough space on at least one of them.
+        """
+
+        usage = self.get_space_usage()
         sufficient_free_space = True
-        for mount_point in mount_devices:
-            part_free = self.get_free_space(mount_point)
-            files_virt_size = sum([os.path.getsize(os.path.realpath(dev)) for dev in mount_devices[mount_point]])
-            files_phys_size = sum([os.stat(os.path.realpath(dev)).st_blocks*512 for dev in mount_devices[mount_point]])
-            if part_free < (files_virt_size - files_phys_size):
-                print("Free space on '%s' is only %s, but accumulated size of (sparse) file-devices is %s!" % (mount_point, bytes2units(part_free), bytes2units(files_virt_size)))
+        width = max([len("MOUNT POINT")] + [len(m) for m in usage])
+        if not quiet:
+            print("%-*s   %7s   %12s   %12s   %12s   %12s   %s" % (width, "MOUNT POINT", "DEVICES", "SIZE", "ALLOCATED", "GROWTH", "FREE", "STATUS"))
+        for mount_point, entry in usage.items():
+            ok = entry["growth"] <= entry["free"]
+            if not quiet:
+                print("%-*s   %7i   %12s   %12s   %12s   %12s   %s" % (width, mount_point, entry["devices"],
+                                                                      bytes2units(entry["logical"]), bytes2units(entry["allocated"]),
+                                                                      bytes2units(entry["growth"]), bytes2units(entry["free"]),
+                                                                      "OK" if ok else "INSUFFICIENT"))
+            if not ok:
+                print("Free space on '%s' is only %s, but the file-devices may still grow by %s!" % (mount_point, bytes2units(entry["free"]), bytes2units(entry["growth"])))
                 sufficient_free_space = False
         return sufficient_free_space
 #}}}
@@ -183,6 +283,16 @@ class device_handler(object):
             if len(foreign_files) > 0:
                 raise DeviceError("Found foreign files in '%s' that need to be removed first: %s" % (storage_dir, foreign_files))
 
+        dev_file = os.path.join(storage_dir, self.exaconf.dev_prefix + str(self.get_next_device_num(node_conf)))
+        return dev_file
+#}}}
+
+#{{{ Get next device num
+    def get_next_device_num(self, node_conf):
+        """
+        Returns the next free device number of the given node (i. e. the highest number of all its devices + 1).
+        """
+
         # build a list of all node devices 
         devices = []
         for disk in node_conf.disks.values():
@@ -192,8 +302,7 @@ class device_handler(object):
         curr_num = 1
         if len(devices) > 0:
             curr_num = max([int(dev.split(".")[1]) for dev in devices]) + 1
-        dev_file = os.path.join(storage_dir, self.exaconf.dev_prefix + str(curr_num))
-        return dev_file
+        return curr_num
 #}}}
 
 #{{{ Get short  name
@@ -212,11 +321,11 @@ class device_handler(object):
         return short_name
 #}}}
 
-#{{{ Remove file devices
-    def remove_file_devices(self, docker_root, node_conf):
+#{{{ List node device files
+    def list_node_device_files(self, docker_root, node_conf):
         """
-        Deletes all existing file-devices (incl. mapped devices) and removes them from EXAConf.
-        Keeps the existing directories.
+        Returns the paths of all existing files in the device directories of the given node (the default
+        storage directory and all mapped directories). Sub-directories are ignored.
         """
 
         # make list of all directories (default storage_dir + mapped directories)
@@ -230,31 +339,95 @@ class device_handler(object):
                         path = os.path.dirname(path)
                     directories.append(path)
         directories.append(os.path.join(os.path.join(docker_root, node_conf.docker_volume), self.exaconf.storage_dir))
+
+        # we list ALL files (no sub-folders) because we don't know if there are "old style" devices (with meta files)
+        return [ os.path.join(d, f) for d in directories for f in os.listdir(d) if os.path.isfile(os.path.join(d, f)) ]
+#}}}
+
+#{{{ Remove device files
+    def remove_device_files(self, dev_files):
+        """
+        Deletes the given device files (errors are only printed).
+
+        Returns the set of deleted devices (short names, see 'get_short_name()').
+        """
+
         deleted_devices = set()
+        for fpath in dev_files:
+            try:
+                os.unlink(fpath)
+                deleted_devices.add(self.get_short_name(fpath))
+            except OSError as e:
+                print("Failed to delete device file '%s': %s" % (fpath, e))
+        return deleted_devices
+#}}}
 
-        # we remove ALL files (no sub-folders) because we don't know if there are "old style" devices (with meta files)
-        for d in directories:
-            for f in os.listdir(d):
-                fpath = os.path.join(d, f)
-                try:
-                    if os.path.isfile(fpath):
-                        os.unlink(fpath)
-                        deleted_devices.add(self.get_short_name(fpath))
-                except Exception as e:
-                    print("Failed to delete device file '%s': " % (fpath, e))
+#{{{ Remove file devices
+    def remove_file_devices(self, docker_root, node_conf):
+        """
+        Deletes all existing file-devices (incl. mapped devices) and removes them from EXAConf.
+        Keeps the existing directories.
+        """
 
+        deleted_devices = self.remove_device_files(self.list_node_device_files(docker_root, node_conf))
         self.exaconf.remove_node_disk(node_conf.id, disk="_all")
         return deleted_devices
 #}}}
 
-#{{{ Create node file devices
-    def create_node_file_devices(self, node_id, disk, num, size, path, replace, no_odirect = False):
+#{{{ Get device alignment
+    def get_device_alignment(self):
+        """
+        Returns the alignment (in bytes) of device files, i. e. the least common multiple of the
+        stripe- and block-sizes of all volumes (or the default volume stripe-size if there are none).
         """
-        Creates $num data (sparese) files of size $size for a single node and adds them to EXAConf.
-        If 'path' is not empty, the devices are created there and corresponding mapping entries
-        are added to EXAConf.
 
-        Returns a tuple of two dicts: created and deleted devices.
+        try:
+            volumes = self.exaconf.get_volumes()
+        except EXAConf.EXAConfError as e:
+            raise DeviceError("Failed to read EXAConf: %s" % e)
+        alignment = self.exaconf.def_vol_stripe_size
+        for vol in volumes.values():
+            for size in (vol.stripe_size, vol.block_size):
+                size = int(size)
+                if size > 0:
+                    alignment = alignment * size // gcd(alignment, size)
+        return alignment
+#}}}
+
+#{{{ Align device size
+    def align_device_size(self, size):
+        """
+        Rounds the given device size down to a multiple of the device alignment (see 'get_device_alignment()'),
+        which results in predictable (and contiguous) extents for the volume stripes.
+        """
+
+        alignment = self.get_device_alignment()
+        aligned_size = (int(size) // alignment) * alignment
+        if aligned_size == 0:
+            raise DeviceError("Device size '%s' is smaller than the volume stripe-size '%s'!" % (bytes2units(int(size)), bytes2units(alignment)))
+        return aligned_size
+#}}}
+
+#{{{ Check allocation mode
+    def check_allocation(self, allocation):
+        """
+        Raises an exception if the given allocation mode is not supported.
+        """
+
+        if allocation not in self.allocation_modes:
+            raise DeviceError("Allocation mode '%s' is not supported (use one of: %s)!" % (allocation, ", ".join(self.allocation_modes)))
+#}}}
+
+#{{{ Prepare node file devices
+    def prepare_node_file_devices(self, node_id, disk, num, path, replace, no_odirect = False):
+        """
+        Prepares the creation of $num file-devices for a single node: removes the existing devices from EXAConf
+        (if 'replace' is true), adds the disk (if it doesn't exist) and allocates the names of the new device files
+        (in memory, without creating them). If 'path' is not empty, the devices will be located there.
+        Has to be called within an EXAConf transaction. The existing device files are not deleted, because
+        they're still needed if the transaction fails (see 'replace_device_files()').
+
+        Returns a tuple of the list of new device files and the list of existing files that are replaced.
         """
 
         try:
@@ -267,10 +440,7 @@ class device_handler(object):
         if docker_conf.device_type != 'file':
             raise DeviceError("Cluster has wrong DeviceType '%s'! Data files can only be used for clusters with DeviceType 'file'!" % docker_conf.device_type)
 
-        disk = disk.strip()
-        dest_dir = ""
-        created_node_devices = []
-        deleted_node_devices = []
+        replaced_files = []
         docker_root = docker_conf.root_dir
         my_conf = nodes_conf[node_id]
         if path and path.strip() != "":
@@ -279,45 +449,162 @@ class device_handler(object):
             dest_dir = os.path.join(os.path.join(docker_root, my_conf.docker_volume), self.exaconf.storage_dir)
         # remove existing devices if requested
         if replace:
-            deleted_node_devices = self.remove_file_devices(docker_root, my_conf)
+            replaced_files = self.list_node_device_files(docker_root, my_conf)
+            self.exaconf.remove_node_disk(node_id, disk="_all")
             # refresh config after deletion
-            nodes_conf = self.exaconf.get_nodes()
-            my_conf = nodes_conf[node_id]
+            my_conf = self.exaconf.get_nodes()[node_id]
         # create disk if it doesn't exist
         if "disks" not in my_conf or disk not in my_conf.disks:
             self.exaconf.add_node_disk(node_id, disk, no_odirect = no_odirect, component='exastorage')
-        for i in range(num):
-            dev_file = self.get_file_name(dest_dir, my_conf, False)
-            # check if file already exists
-            # --> can happen easily in case of external mappings
+        # allocate the device names
+        first_num = self.get_next_device_num(my_conf)
+        dev_files = [ os.path.join(dest_dir, self.exaconf.dev_prefix + str(n)) for n in range(first_num, first_num + num) ]
+        # check if the files already exist
+        # --> can happen easily in case of external mappings
+        for dev_file in dev_files:
             if os.path.exists(dev_file) and not replace:
                 raise DeviceError("File '%s' already exists! Please remove it." % dev_file)
-            # create sparse file
+        return (dev_files, replaced_files)
+#}}}
+
+#{{{ Staging path
+    def staging_path(self, dev_file):
+        """
+        Returns the path where the given device file is created if it replaces existing devices
+        (the existing files are kept until the changes have been committed).
+        """
+
+        return os.path.join(os.path.dirname(dev_file), "." + os.path.basename(dev_file) + ".new")
+#}}}
+
+#{{{ Create device file
+    def create_device_file(self, dev_file, size, allocation = "sparse"):
+        """
+        Creates the given device file with the given size. Depending on 'allocation', the file is:
+        - 'sparse'    : sparse (blocks are allocated on first write)
+        - 'fallocate' : preallocated using fallocate (fast, but not supported by all filesystems)
+        - 'zero'      : filled with zeros (slow, but works everywhere)
+        """
+
+        try:
             with open(dev_file, "wb") as d:
-                d.truncate(size)
-            # add device to EXAConf
+                if allocation == "fallocate":
+                    os.posix_fallocate(d.fileno(), 0, int(size))
+                elif allocation == "zero":
+                    zeros = bytes(self.zero_chunk_size)
+                    remaining = int(size)
+                    while remaining > 0:
+                        remaining -= d.write(zeros[:min(remaining, len(zeros))])
+                    d.flush()
+                    os.fsync(d.fileno())
+                else:
+                    d.truncate(int(size))
+        except OSError as e:
+            raise DeviceError("Failed to create device file '%s': %s" % (dev_file, e))
+#}}}
+
+#{{{ Create device files
+    def create_device_files(self, dev_files, size, allocation = "sparse"):
+        """
+        Creates all given device files (concurrently, see 'create_device_file()'). If the creation
+        of a file fails, all files created by this call are removed again.
+        """
+
+        results = parallel_map(lambda f: self.create_device_file(f, size, allocation), dev_files, max_workers = self.parallel)
+        errors = [ e for f, res, e in results if e is not None ]
+        if len(errors) > 0:
+            for f, res, e in results:
+                if e is None:
+                    try:
+                        os.unlink(f)
+                    except OSError:
+                        pass
+            raise DeviceError("Failed to create %i device file(s): %s" % (len(errors), "; ".join(e.msg[len(e.prefix):] if isinstance(e, DeviceError) else str(e) for e in errors)))
+#}}}
+
+#{{{ Discard device files
+    def discard_device_files(self, dev_files):
+        """
+        Removes the given (newly created) device files, e. g. if the EXAConf changes could not be committed.
+        Files that don't exist are ignored.
+        """
+
+        for f in dev_files:
+            try:
+                os.unlink(f)
+            except OSError:
+                pass
+#}}}
+
+#{{{ Replace device files
+    def replace_device_files(self, dev_files, replaced_files):
+        """
+        Deletes the replaced device files and moves the new ones (created at their staging path, see
+        'staging_path()') to their final location. Has to be called after the changes have been committed.
+
+        Returns the set of deleted devices (see 'remove_device_files()').
+        """
+
+        # leftovers of an interrupted run may have the same name as the new files
+        staged_files = set(self.staging_path(f) for f in dev_files)
+        deleted_devices = self.remove_device_files([ f for f in replaced_files if f not in staged_files ])
+        for dev_file in dev_files:
             try:
-                self.exaconf.add_node_device(node_id, disk,
-                                             os.path.basename(dev_file),
-                                             path if path and path != "" else None)
-                # we need to refresh the node configuration for each device, 
-                # otherwise the names would be wrong when adding multiple devices at once!
-                nodes_conf = self.exaconf.get_nodes()
-                my_conf = nodes_conf[node_id]
-            except EXAConf.EXAConfError as e:
-                raise DeviceError("Failed to read EXAConf: %s" % e)
-            # store only short-name
-            created_node_devices.append(dev_file)
-
-        return (created_node_devices, deleted_node_devices)
+                os.rename(self.staging_path(dev_file), dev_file)
+            except OSError as e:
+                raise DeviceError("Failed to move device file '%s' to '%s': %s" % (self.staging_path(dev_file), dev_file, e))
+        return deleted_devices
+#}}}
+
+#{{{ Create node file devices
+    def create_node_file_devices(self, node_id, disk, num, size, path, replace, no_odirect = False, allocation = "sparse"):
+        """
+        Creates $num data files of size $size for a single node and adds them to EXAConf.
+        If 'path' is not empty, the devices are created there and corresponding mapping entries
+        are added to EXAConf. The size is rounded down to a multiple of the volume stripe-size and
+        'allocation' determines how the files are allocated (see 'create_device_file()').
+
+        Replaced devices are only deleted after the changes have been committed. If an error occurs, the
+        new files are removed again (see 'replace_device_files()').
+
+        Returns a tuple of two dicts: created and deleted devices.
+        """
+
+        self.check_allocation(allocation)
+        size = self.align_device_size(size)
+        disk = disk.strip()
+        new_files = []
+        # all changes are committed at once (and reverted on errors)
+        try:
+            with self.exaconf.transaction():
+                dev_files, replaced_files = self.prepare_node_file_devices(node_id, disk, num, path, replace, no_odirect = no_odirect)
+                new_files = [ self.staging_path(f) for f in dev_files ] if replace else dev_files
+                self.create_device_files(new_files, size, allocation)
+                try:
+                    self.exaconf.add_node_devices(node_id, disk, [ os.path.basename(f) for f in dev_files ],
+                                                  path if path and path != "" else None)
+                except EXAConf.EXAConfError as e:
+                    raise DeviceError("Failed to read EXAConf: %s" % e)
+        except BaseException:
+            self.discard_device_files(new_files)
+            raise
+
+        deleted_node_devices = set()
+        if replace:
+            deleted_node_devices = self.replace_device_files(dev_files, replaced_files)
+        return (dev_files, deleted_node_devices)
 #}}}
 
 #{{{ Create file devices
-    def create_file_devices(self, disk, num, size, path, replace, no_odirect = False):
+    def create_file_devices(self, disk, num, size, path, replace, no_odirect = False, allocation = "sparse"):
         """
-        Creates $num data (sparse) files of size $size for all nodes and adds them to EXAConf.
+        Creates $num data files of size $size for all nodes and adds them to EXAConf.
         If 'path' is not empty, the devices are created there and corresponding mapping entries
-        are added to EXAConf.
+        are added to EXAConf. The size is rounded down to a multiple of the volume stripe-size and
+        'allocation' determines how the files are allocated (see 'create_device_file()'). The files
+        of all nodes are created concurrently and EXAConf is written once. Replaced devices are only
+        deleted after the changes have been committed and the new files are removed again if an error
+        occurs (see 'create_node_file_devices()').
 
         Returns a tuple of two dicts: created and deleted devices per node.
         """
@@ -327,38 +614,64 @@ class device_handler(object):
         except EXAConf.EXAConfError as e:
             raise DeviceError("Failed to read EXAConf: %s" % e)
 
+        self.check_allocation(allocation)
+        size = self.align_device_size(size)
         disk = disk.strip()
         created_devices = odict()
+        replaced_files = odict()
         deleted_devices = odict()
-        for node_id in nodes_conf:
-            # create sub-directory for current node in case a path is given 
-            node_path = ""
-            if path and path.strip() != "":
-                path = os.path.realpath(os.path.abspath(path))
-                # raise error if path does not exist
-                if not os.path.exists(path):
-                    raise DeviceError("'%s' does not exist!" % path)
-                node_path = os.path.join(path.strip(), nodes_conf[node_id].name)
-                if not os.path.exists(node_path):
-                    try:
-                        os.makedirs(node_path)
-                    except OSError as e:
-                        raise DeviceError("Failed to create directory '%s': %s" % (node_path, e))
-            devices = self.create_node_file_devices(node_id, disk, num, size, node_path, replace, no_odirect = no_odirect)
-            created_devices[node_id] = devices[0]
-            if len(devices[1]) > 0:
-                deleted_devices[node_id] = devices[1]
+        node_paths = odict()
+        new_files = []
+        # all changes are committed at once (and reverted on errors)
+        try:
+            with self.exaconf.transaction():
+                for node_id in nodes_conf:
+                    # create sub-directory for current node in case a path is given 
+                    node_path = ""
+                    if path and path.strip() != "":
+                        path = os.path.realpath(os.path.abspath(path))
+                        # raise error if path does not exist
+                        if not os.path.exists(path):
+                            raise DeviceError("'%s' does not exist!" % path)
+                        node_path = os.path.join(path.strip(), nodes_conf[node_id].name)
+                        if not os.path.exists(node_path):
+                            try:
+                                os.makedirs(node_path)
+                            except OSError as e:
+                                raise DeviceError("Failed to create directory '%s': %s" % (node_path, e))
+                    node_paths[node_id] = node_path
+                    devices = self.prepare_node_file_devices(node_id, disk, num, node_path, replace, no_odirect = no_odirect)
+                    created_devices[node_id], replaced_files[node_id] = devices
+                # create the files of all nodes at once
+                dev_files = [ f for files in created_devices.values() for f in files ]
+                new_files = [ self.staging_path(f) for f in dev_files ] if replace else dev_files
+                self.create_device_files(new_files, size, allocation)
+                try:
+                    for node_id, node_files in created_devices.items():
+                        self.exaconf.add_node_devices(node_id, disk, [ os.path.basename(f) for f in node_files ],
+                                                      node_paths[node_id] if node_paths[node_id] != "" else None)
+                except EXAConf.EXAConfError as e:
+                    raise DeviceError("Failed to read EXAConf: %s" % e)
+        except BaseException:
+            self.discard_device_files(new_files)
+            raise
 
+        if replace:
+            for node_id, node_files in created_devices.items():
+                deleted = self.replace_device_files(node_files, replaced_files[node_id])
+                if len(deleted) > 0:
+                    deleted_devices[node_id] = deleted
         return (created_devices, deleted_devices)
 #}}}
 
 #{{{ Auto create file devices
-    def auto_create_file_devices(self, container_internal=False, no_odirect=False, max_space=None):
+    def auto_create_file_devices(self, container_internal=False, no_odirect=False, max_space=None, allocation="sparse"):
         """
         Automatically determines the available free space in the root directory of the current
         cluster and creates one file device per node for the default disk. 'container_internal'
         has to be True if this function is called from within a container (e. g. during the 
-        initialization of a self-contained image).
+        initialization of a self-contained image). 'allocation' determines how the device files
+        are allocated (see 'create_device_file()').
 
         Throws an exception if the cluster already contains disks and devices.
         """
@@ -386,22 +699,32 @@ class device_handler(object):
             if len(node.disks) > 0:
                 raise DeviceError("Devices can't be auto-generated because this cluster alreay has disks!") 
         
-        bytes_per_node = root_usable // len(nodes_conf)
-
-        # create the device-file in the local storage directory
-        if container_internal == True:
-            self.create_node_file_devices("11", self.def_disk_name, 1, bytes_per_node, 
-                                          os.path.join(self.exaconf.container_root, self.exaconf.storage_dir),
-                                          False, no_odirect = no_odirect)
-        else:
-            self.create_file_devices(self.def_disk_name, 1, bytes_per_node, "", False, no_odirect = no_odirect)
+        bytes_per_node = self.align_device_size(root_usable // len(nodes_conf))
 
+        dev_files = []
+        # all changes are committed at once (and reverted on errors)
+        # --> the new device-files are removed if the changes can't be committed
         try:
-            # leave some room for the temporary volume!
-            self.exaconf.use_disk_for_volumes(self.def_disk_name, bytes_per_node * 0.666, 
-                                              min_vol_size = self.auto_min_vol_size,
-                                              vol_resize_step = self.vol_resize_step)
-        except EXAConf.EXAConfError as e:
-            raise DeviceError("Failed to use new disk for the existing volumes: %s" % e)
+            with self.exaconf.transaction():
+                # create the device-file in the local storage directory
+                if container_internal == True:
+                    dev_files = self.create_node_file_devices("11", self.def_disk_name, 1, bytes_per_node, 
+                                                              os.path.join(self.exaconf.container_root, self.exaconf.storage_dir),
+                                                              False, no_odirect = no_odirect, allocation = allocation)[0]
+                else:
+                    created_devices = self.create_file_devices(self.def_disk_name, 1, bytes_per_node, "", False,
+                                                               no_odirect = no_odirect, allocation = allocation)[0]
+                    dev_files = [ f for files in created_devices.values() for f in files ]
+
+                try:
+                    # leave some room for the temporary volume!
+                    self.exaconf.use_disk_for_volumes(self.def_disk_name, bytes_per_node * 0.666, 
+                                                      min_vol_size = self.auto_min_vol_size,
+                                                      vol_resize_step = self.vol_resize_step)
+                except EXAConf.EXAConfError as e:
+                    raise DeviceError("Failed to use new disk for the existing volumes: %s" % e)
+        except BaseException:
+            self.discard_device_files(dev_files)
+            raise
 
 #}}}
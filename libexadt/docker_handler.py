@@ -1,29 +1,79 @@
-import os,docker,pprint,shutil
+import os,re,docker,pprint,shutil,threading,time,math,gzip,codecs,socket
 from . import device_handler
 from docker.utils import kwargs_from_env
 from . import EXAConf
-from .util import rotate_file
+from .util import rotate_file, parallel_map, md5, atomic_file_writer
 from .EXAConf import config
 
 ip_types = { 4: 'ipv4_address', 6: 'ipv6_address' }
  
 #{{{ Class DockerError
 class DockerError(Exception):
+    prefix = "ERROR::DockerHandler: "
     def __init__(self, msg):
-        self.msg = "ERROR::DockerHandler: " + msg
+        self.msg = self.prefix + msg
     def __str__(self):
         return repr(self.msg)
 #}}}
  
+#{{{ Class output_logger
+class output_logger(object):
+    """
+    Logs the output of a command (given in chunks of bytes) using the given log function. If 'prefix'
+    is given, the output is logged line by line with the given prefix (so the output of concurrent
+    executions can be distinguished).
+    """
+    def __init__(self, log, prefix=None):
+        self._log = log
+        self._prefix = prefix
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._pending = ""
+
+    def write(self, data):
+        if self._prefix is None:
+            self._log(data.decode(errors="replace"))
+            return
+        lines = (self._pending + self._decoder.decode(data)).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._log(self._prefix + line)
+
+    def close(self):
+        if self._prefix is None:
+            return
+        self._pending += self._decoder.decode(b"", final=True)
+        if self._pending != "":
+            self._log(self._prefix + self._pending)
+        self._pending = ""
+#}}}
+
 class docker_handler(object):
     """ Implements all docker commands. Depends on the 'docker' python module (https://github.com/docker/docker-py). """
 
+    # max. nr. of containers that are processed concurrently (by default)
+    default_parallel = 8
+    # max. age (in seconds) of the container snapshot (see 'get_containers()')
+    container_cache_ttl = 60
+    # interval (in seconds) for checking the readiness of the nodes (see 'wait_online()')
+    ready_poll_interval = 0.5
+    # container states (as reported by docker events)
+    event_states = { 'start' : 'running', 'restart' : 'running', 'unpause' : 'running',
+                     'pause' : 'paused', 'die' : 'exited', 'stop' : 'exited' }
+
 #{{{ Init
-    def __init__(self, verbose=False, quiet=False):
+    def __init__(self, verbose=False, quiet=False, parallel=None):
         """
-        Creates a new docker_handler and a docker.APIClient (used for communication with the docker service).
+        Creates a new docker_handler. The docker.APIClient (used for communication with the docker service)
+        is created on first use (see 'client'). 'parallel' is the max. nr. of containers that are
+        processed concurrently (1 means serial processing).
         """
-        self.client = docker.APIClient(timeout=120, **kwargs_from_env())
+        self._client = None
+        self._log_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._containers = None
+        self._containers_time = 0
+        self._events_thread = None
+        self.parallel = parallel if parallel else self.default_parallel
         self.verbose = verbose
         self.quiet = quiet
         if self.quiet:
@@ -31,13 +81,46 @@ class docker_handler(object):
         self.def_container_cmd = None 
 #}}}
 
+#{{{ Client
+    @property
+    def client(self):
+        """
+        Returns the docker.APIClient (creates it on first access, because it already
+        contacts the docker service in order to determine the API version).
+        """
+        if self._client is None:
+            try:
+                self._client = docker.APIClient(timeout=120, **kwargs_from_env())
+            except docker.errors.DockerException as e:
+                raise DockerError("Failed to connect to the docker service: %s" % e)
+        return self._client
+#}}}
+
+#{{{ API version
+    @property
+    def api_version(self):
+        """
+        Returns the docker API version that is used for the container configuration (see 'prepare_containers()').
+        """
+        return self.client.api_version
+#}}}
+
 #{{{ log
     def log(self, msg, no_nl=False):
         if not self.quiet:
-            if no_nl:
-                print(msg, end=' ')
-            else:
-                print(msg)
+            with self._log_lock:
+                if no_nl:
+                    print(msg, end=' ')
+                else:
+                    print(msg)
+#}}}
+
+#{{{ Format errors
+    def format_errors(self, errors):
+        """
+        Returns a string containing all errors of the given list of (container name, exception) tuples.
+        """
+        return "; ".join("'%s': %s" % (name, e.msg[len(e.prefix):] if isinstance(e, DockerError) else e) for name, e in errors)
 #}}}
 
 #{{{ Set EXAConf object for this instace of docker-handler
@@ -81,15 +164,14 @@ class docker_handler(object):
 #{{{ Inspect containers
     def inspect_containers(self):
         """
-        Returns the concatenated raw output of 'inspect_container()".
+        Returns the concatenated raw output of 'inspect_container()" (containers are inspected concurrently).
         """
 
-        res = {}
         containers = self.get_containers(all=True)
-        for container in containers:
-            try:
-                ci = self.client.inspect_container(container)
-            except docker.errors.APIError as e:
+        results = parallel_map(self.client.inspect_container, containers, max_workers = self.parallel)
+        res = {}
+        for container, ci, e in results:
+            if e is not None:
                 raise DockerError("Failed to inspect container '%s' : '%s'" % (self.container_name(container), e))
             res[self.container_name(container)] = ci
         return res
@@ -225,14 +307,91 @@ class docker_handler(object):
         """ 
         Returns a list of all containers of the current cluster (only running ones if all==False). 
         They are identified using the 'ClusterName' label.
+
+        The containers are listed only once and the snapshot is then updated by a background thread
+        that listens to the docker events of this cluster (see 'watch_events()'). Changes made by this
+        docker_handler are applied immediately. The snapshot is discarded after 'container_cache_ttl'
+        seconds or if the events can't be received.
         """
 
-        try:
-            my_containers = self.client.containers(all=all, filters = {'label':'ClusterName=' + self.cluster_name})
-        except docker.errors.APIError as e:
-            raise DockerError("Failed to query containers for cluster '%s': %s" % (self.cluster_name, e))
+        with self._cache_lock:
+            if (self._containers is None or self._events_thread is None or
+                time.monotonic() - self._containers_time > self.container_cache_ttl):
+                # start listening before listing, so no event is missed (replayed events don't do any harm)
+                since = int(time.time()) - 1
+                try:
+                    containers = self.client.containers(all=True, filters = {'label':'ClusterName=' + self.cluster_name})
+                except docker.errors.APIError as e:
+                    raise DockerError("Failed to query containers for cluster '%s': %s" % (self.cluster_name, e))
+                self._containers = { c['Id'] : c for c in containers }
+                self._containers_time = time.monotonic()
+                if self._events_thread is None:
+                    self._events_thread = threading.Thread(target = self.watch_events, args = (since,), daemon = True)
+                    self._events_thread.start()
+            my_containers = [ dict(c) for c in self._containers.values() ]
+        if not all:
+            my_containers = [ c for c in my_containers if c['State'] in ('running', 'paused', 'restarting') ]
         return my_containers
 #}}}
+
+#{{{ Watch events
+    def watch_events(self, since):
+        """
+        Applies all docker events of the containers of the current cluster (starting at 'since') to the
+        container snapshot (see 'get_containers()'). Runs in a background thread until the stream ends.
+        """
+
+        try:
+            events = self.client.events(since = since, decode = True,
+                                        filters = {'type' : 'container', 'label' : 'ClusterName=' + self.cluster_name})
+            for event in events:
+                action = event.get('Action', event.get('status', ''))
+                cid = event.get('id', event.get('Actor', {}).get('ID'))
+                if action == 'create':
+                    # the event does not contain all information (e. g. 'Mounts')
+                    for c in self.client.containers(all=True, filters = {'id' : cid}):
+                        self.update_cached_container(cid, c)
+                elif action == 'destroy':
+                    self.update_cached_container(cid, None)
+                elif action.startswith('health_status:'):
+                    self.update_cached_container(cid, {'Health' : action.split(':', 1)[1].strip()})
+                elif action in self.event_states:
+                    self.update_cached_container(cid, {'State' : self.event_states[action]})
+        except Exception:
+            pass
+        # the snapshot can't be updated anymore
+        with self._cache_lock:
+            self._containers = None
+            self._events_thread = None
+#}}}
+
+#{{{ Invalidate containers
+    def invalidate_containers(self):
+        """
+        Discards the container snapshot (i. e. the containers are listed again by the next call of 'get_containers()').
+        """
+        with self._cache_lock:
+            self._containers = None
+#}}}
+
+#{{{ Update cached container
+    def update_cached_container(self, cid, values):
+        """
+        Updates the given container within the snapshot with the given values (or removes
+        it if 'values' is None). Containers that are not in the snapshot are only added if
+        all values are given (i. e. 'Names' is part of them).
+        """
+
+        with self._cache_lock:
+            if self._containers is None:
+                return
+            if values is None:
+                self._containers.pop(cid, None)
+            elif cid in self._containers:
+                self._containers[cid].update(values)
+            elif 'Names' in values:
+                self._containers[cid] = dict(values)
+#}}}
  
 #{{{ Get image conf
     def get_image_conf(self, image_name):
@@ -252,16 +411,20 @@ class docker_handler(object):
         return image_conf
 #}}}
 
-#{{{ Create containers
-    def create_containers(self, networks=None, cmd=None, auto_remove=False):
-        """ 
-        Creates one container per node. Takes care of volumes, block-devices, environment, labels
-        and additional container configuration.
-        
-        Returns a list of created containers.
+#{{{ Prepare containers
+    def prepare_containers(self, networks=None, cmd=None, auto_remove=False, version=None):
         """
+        Prepares the configuration of one container per node (doesn't contact the docker service, except
+        for determining the API version if 'version' is None). Takes care of volumes, block-devices, host-
+        and network-configuration. The first network is removed from the given list, because it's part of
+        the container configuration.
+
+        Returns a tuple of the list of container configurations, the remaining networks and the command.
+        """
+
+        if version is None:
+            version = self.api_version
 
-        created_containers = []
         try:
             nodes_conf = self.exaconf.get_nodes()
             if self.verbose:
@@ -290,14 +453,14 @@ class docker_handler(object):
         # the container at creation time (necessary to avoid that the container 
         # is attached to the default network)
         first_net = None
-        net_conf = None
         if networks and len(networks) > 0:
             first_net = networks.pop(0)
-        # create containers for all nodes
+        container_confs = []
         for node_id in nodes_conf:
             container_name = self.cluster_name + "_" + str(node_id)
             my_conf = nodes_conf[node_id]
             devices = []
+            net_conf = None
 
             # 1.) configure devices, volumes, first network and host-options
             # a. default node volumes
@@ -355,15 +518,16 @@ class docker_handler(object):
             if "exposed_ports" in my_conf:
                 port_binds = dict(my_conf.exposed_ports)
             # create host config
-            hc = self.client.create_host_config(privileged = docker_conf.privileged,
-                                                cap_add = docker_conf.cap_add,
-                                                cap_drop = docker_conf.cap_drop,
-                                                network_mode = docker_conf.network_mode,
-                                                ipc_mode=docker_conf.ipc_mode,
-                                                auto_remove = auto_remove,
-                                                binds = binds,
-                                                devices = devices,
-                                                port_bindings = port_binds)
+            hc = docker.types.HostConfig(version = version,
+                                         privileged = docker_conf.privileged,
+                                         cap_add = docker_conf.cap_add,
+                                         cap_drop = docker_conf.cap_drop,
+                                         network_mode = docker_conf.network_mode,
+                                         ipc_mode=docker_conf.ipc_mode,
+                                         auto_remove = auto_remove,
+                                         binds = binds,
+                                         devices = devices,
+                                         port_bindings = port_binds)
             # create config for the first network (see above)
             if first_net:
                 ip = ""
@@ -371,87 +535,170 @@ class docker_handler(object):
                     ip = my_conf.private_ip
                 elif first_net['MyScope'] == 'public':
                     ip = my_conf.public_ip
-                ep_conf = self.client.create_endpoint_config(**{ip_types[self.exaconf.ip_type(ip)]: ip}) 
-                net_conf = self.client.create_networking_config({first_net['MyName']: ep_conf})
+                ep_conf = docker.types.EndpointConfig(version, **{ip_types[self.exaconf.ip_type(ip)]: ip})
+                net_conf = docker.types.NetworkingConfig({first_net['MyName']: ep_conf})
 
-            # 2.) create container
-            self.log("Creating container '%s'..." % container_name, no_nl=True)
+            container_confs.append({'node_id' : node_id,
+                                    'name' : container_name,
+                                    'node_conf' : my_conf,
+                                    'volumes' : volumes,
+                                    'host_config' : hc,
+                                    'networking_config' : net_conf,
+                                    'ports' : list(port_binds)})
+        return (container_confs, networks, cmd)
+#}}}
+
+#{{{ Create containers
+    def create_containers(self, networks=None, cmd=None, auto_remove=False):
+        """ 
+        Creates one container per node (see 'prepare_containers()'). Up to 'self.parallel'
+        containers are created concurrently.
+        
+        Returns a list of created containers.
+        """
+
+        container_confs, networks, cmd = self.prepare_containers(networks, cmd, auto_remove)
+        # 2.) create the containers (concurrently) and attach them to the remaining networks
+        # --> no new containers are created after the first error (the existing ones are
+        #     removed by the caller, see 'start_cluster()')
+        results = parallel_map(lambda cc: self.create_container(cc, networks, cmd), container_confs,
+                               max_workers = self.parallel, stop_on_error = True)
+        errors = [ (cc['name'], e) for cc, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to create %i container(s): %s" % (len(errors), self.format_errors(errors)))
+        return [ res for cc, res, e in results ]
+#}}}
+
+#{{{ Container create args
+    def container_create_args(self, container_conf, cmd):
+        """
+        Returns the arguments for creating the container with the given configuration
+        (see 'prepare_containers()'), i. e. all arguments of 'docker.APIClient.create_container()'
+        except for the image.
+        """
+
+        my_conf = container_conf['node_conf']
+        node_id = container_conf['node_id']
+        return {'hostname' : my_conf.name,
+                'detach' : True,
+                'stdin_open' : True,
+                'tty' : True,
+                'name' : container_conf['name'],
+                'labels' : {'ClusterName' : self.cluster_name,
+                            'NodeID' : node_id,
+                            'Name' : my_conf.name},
+                'environment' : {'EXA_NODE_ID' : node_id},
+                'stop_timeout' : 60,
+                'volumes' : container_conf['volumes'],
+                'host_config' : container_conf['host_config'],
+                'networking_config' : container_conf['networking_config'],
+                'ports' : container_conf['ports'],
+                'entrypoint' : cmd}
+#}}}
+
+#{{{ Create container
+    def create_container(self, container_conf, networks, cmd):
+        """
+        Creates a single container (using the configuration prepared by 'create_containers()')
+        and attaches it to the given networks (i. e. all networks except the first one).
+        Can be called concurrently for different containers.
+
+        Returns the created container.
+        """
+
+        container_name = container_conf['name']
+        my_conf = container_conf['node_conf']
+        try:
+            container = self.client.create_container(self.image, **self.container_create_args(container_conf, cmd))
+        except docker.errors.ImageNotFound as e:
+            raise DockerError("Image '%s' not found: %s" % (self.image, e))
+        except docker.errors.APIError as e:
+            raise DockerError("Failed to create container: %s" % e)
+        # add name (not part of the returned dict)
+        container['MyName'] = container_name
+        # the new container has to be part of all subsequent listings
+        # (even if the 'create' event has not yet been received)
+        self.invalidate_containers()
+        self.log("Created container '%s'." % container_name)
+        if self.verbose:
+            with self._log_lock:
+                print("Created the following container:")
+                pprint.pprint(container)
+
+        # attach container to the remaining network(s)
+        for net in (networks or []):
+            ip = ""
+            if net['MyScope'] == 'private':
+                ip = my_conf.private_ip
+            elif net['MyScope'] == 'public':
+                ip = my_conf.public_ip
             try:
-                container = self.client.create_container(self.image,
-                                                         hostname = my_conf.name,
-                                                         detach = True,
-                                                         stdin_open = True,
-                                                         tty = True,
-                                                         name = container_name,
-                                                         labels = {'ClusterName' : self.cluster_name,
-                                                                   'NodeID' : node_id,
-                                                                   'Name' : my_conf.name},
-                                                         environment = {'EXA_NODE_ID' : node_id},
-                                                         stop_timeout = 60,
-                                                         volumes = volumes,
-                                                         host_config = hc,
-                                                         networking_config = net_conf,
-                                                         ports = list(port_binds),
-                                                         entrypoint = cmd)
-                created_containers.append(container)
-                # add name (not part of the returned dict)
-                container['MyName'] = container_name
-                self.log("successful")
-                if self.verbose:
-                    print("Created the following container:")
-                    pprint.pprint(container)
-            except docker.errors.ImageNotFound as e:
-                raise DockerError("Image '%s' not found: %s" % (self.image, e))
+                self.client.connect_container_to_network(container = container['Id'],
+                                                         net_id = net['Id'],
+                                                         **{ip_types[self.exaconf.ip_type(ip)]: ip})
             except docker.errors.APIError as e:
-                raise DockerError("Failed to create container: %s" % e)
-
-            # 3.) attach container to the remaining network(s)
-            if networks:
-                for net in networks:
-                    ip = ""
-                    if net['MyScope'] == 'private':
-                        ip = my_conf.private_ip
-                    elif net['MyScope'] == 'public':
-                        ip = my_conf.public_ip
-                    self.log("Connecting container '%s' to network '%s' with IP '%s'..." % (container['MyName'], net['MyName'], ip), no_nl=True)
-                    try:
-                        self.client.connect_container_to_network(container = container['Id'],
-                                                                 net_id = net['Id'],
-                                                                 **{ip_types[self.exaconf.ip_type(ip)]: ip})
-                        self.log("successful")
-                    except docker.errors.APIError as e:
-                        raise DockerError("Failed to connect network: %s" % e)
-
-        return created_containers  
+                raise DockerError("Failed to connect network: %s" % e)
+            self.log("Connected container '%s' to network '%s' with IP '%s'." % (container_name, net['MyName'], ip))
+        return container
 #}}}
 
 #{{{ Start containers
     def start_containers(self, containers):
         """ 
-        Starts all given containers.
+        Starts all given containers (concurrently).
         """
 
-        started_containers = []
-
-        for container in containers:
+        def start_container(container):
             if self.verbose:
-                print("Going to start the following container:")
-                pprint.pprint(container)
+                with self._log_lock:
+                    print("Going to start the following container:")
+                    pprint.pprint(container)
             try:
-                self.log("Starting container '%s'..." % container['MyName'], no_nl=True)
                 self.client.start(container=container['Id'])
-                started_containers.append(container)
-                self.log("successful")
             except docker.errors.APIError as e:
                 raise DockerError("Failed to start container: %s" % e)
-        return started_containers
+            self.update_cached_container(container['Id'], {'State' : 'running'})
+            self.log("Started container '%s'." % container['MyName'])
+            return container
+
+        results = parallel_map(start_container, containers, max_workers = self.parallel)
+        errors = [ (c['MyName'], e) for c, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to start %i container(s): %s" % (len(errors), self.format_errors(errors)))
+        return [ res for c, res, e in results ]
+#}}}
+
+#{{{ Stop container
+    def stop_container(self, container, deadline):
+        """
+        Stops the given container (if it's running). If it doesn't terminate before the given deadline
+        (see 'time.monotonic()'), it's killed. Can be called concurrently for different containers.
+
+        Returns True if the container has been stopped, False if it was not running.
+        """
+
+        if container['State'] not in ('running', 'paused', 'restarting'):
+            return False
+        if self.verbose:
+            with self._log_lock:
+                print("Going to stop the following container:")
+                pprint.pprint(container)
+        timeout = max(0, int(math.ceil(deadline - time.monotonic())))
+        try:
+            self.client.stop(container['Id'], timeout)
+        except docker.errors.APIError as e:
+            raise DockerError("Failed to stop container: %s" % e)
+        container['State'] = 'exited'
+        self.update_cached_container(container['Id'], {'State' : 'exited'})
+        self.log("Stopped container '%s'." % self.container_name(container))
+        return True
 #}}}
 
 #{{{ Stop containers
     def stop_containers(self, timeout):
         """ 
         Stops all running containers from the current cluster. If they don't terminate within the given timeout, 
-        they are killed.
+        they are killed. The containers are stopped concurrently, i. e. the timeout applies to the whole cluster.
         """
 
         containers = self.get_containers()
@@ -459,36 +706,39 @@ class docker_handler(object):
             self.log("No containers found for cluster '%s'." % self.cluster_name)
             return False
 
-        # stop them
-        num_running = 0
-        num_stopped = 0
-        err = False
-        for container in containers:
-            if self.verbose:
-                print("Found the following container:")
-                pprint.pprint(container)
-            state = container['State']
-            if state == 'running' or state == 'paused' or state == 'restarting':
-                num_running += 1
-                try:
-                    self.log("Stopping container '%s'..." % self.container_name(container), no_nl=True)
-                    self.client.stop(container['Id'], int(timeout))
-                    num_stopped += 1
-                    self.log("successful")
-                except docker.errors.APIError as e:
-                    print("Failed to stop container '%s': %s" % (self.container_name(container), e))
-                    err = True
-            else:
-                num_stopped += 1
-
-        if err:
-            raise DockerError("Failed to stop all containers!")    
+        # stop them (all at once, because stopping mostly means waiting)
+        deadline = time.monotonic() + int(timeout)
+        results = parallel_map(lambda c: self.stop_container(c, deadline), containers, max_workers = len(containers))
+        errors = [ (self.container_name(c), e) for c, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to stop %i container(s): %s" % (len(errors), self.format_errors(errors)))
+        num_running = len([ res for c, res, e in results if res is True ])
         if num_running == 0:
             self.log("No running containers found for cluster '%s'." % self.cluster_name)
         elif self.verbose:
             print("Successfully stopped %i containers." % num_running)
 
-        return num_stopped > 0
+        return True
+#}}}
+
+#{{{ Remove container
+    def remove_container(self, container):
+        """
+        Removes the given container if it has exited (or has never been started).
+        Can be called concurrently for different containers.
+
+        Returns True if the container has been removed.
+        """
+
+        if container['State'] not in ('exited', 'created'):
+            return False
+        try:
+            self.client.remove_container(container['Id'])
+        except docker.errors.APIError as e:
+            raise DockerError("Failed to remove container: %s" % e)
+        self.update_cached_container(container['Id'], None)
+        self.log("Removed container '%s'." % self.container_name(container))
+        return True
 #}}}
 
 #{{{ Remove containers
@@ -502,24 +752,136 @@ class docker_handler(object):
             self.log("No containers found for cluster '%s'." % self.cluster_name)
             return False
 
-        err = False
-        for container in containers:
-            state = container['State']
-            if state == 'exited' or state == 'created':
-                self.log("Removing container '%s'..." % self.container_name(container), no_nl=True)
-                try:
-                    self.client.remove_container(container['Id'])
-                    self.log("successful")
-                except docker.errors.APIError as e:
-                    print("Failed to remove container '%s': %s" % (self.container_name(container), e))
-                    err = True
+        results = parallel_map(self.remove_container, containers, max_workers = self.parallel)
+        errors = [ (self.container_name(c), e) for c, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to remove %i container(s): %s" % (len(errors), self.format_errors(errors)))
 
-        if err:
-            raise DockerError("Failed to remove all containers!")
+        return True
+#}}}
+
+#{{{ Shutdown containers
+    def shutdown_containers(self, timeout, compress_logs=False):
+        """
+        Stops all containers of the current cluster concurrently (within the given timeout, see
+        'stop_containers()'). As soon as a container has exited, its logs are saved (see
+        'save_container_logs()') and it is removed.
+
+        Returns False if the cluster has no containers.
+        """
 
+        containers = self.get_containers()
+        if len(containers) == 0:
+            self.log("No containers found for cluster '%s'." % self.cluster_name)
+            return False
+
+        deadline = time.monotonic() + int(timeout)
+        def shutdown_container(container):
+            try:
+                self.stop_container(container, deadline)
+            finally:
+                # logs are saved even if the container could not be stopped
+                self.save_container_logs(container, compress = compress_logs)
+            self.remove_container(container)
+
+        results = parallel_map(shutdown_container, containers, max_workers = len(containers))
+        errors = [ (self.container_name(c), e) for c, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to shut down %i container(s): %s" % (len(errors), self.format_errors(errors)))
         return True
 #}}}
 
+#{{{ Probe address
+    def probe_address(self, node_conf, db_port):
+        """
+        Returns the (host, port) tuple that is used for checking if the given node is serving, i. e.
+        the host port that is mapped to the DB port (if exposed) or the DB port on the node's IP.
+        """
+        for container_port, host_port in node_conf.get("exposed_ports", []):
+            if container_port == db_port:
+                return ("127.0.0.1", host_port)
+        if self.exaconf.get_docker_conf().network_mode == "host":
+            return ("127.0.0.1", db_port)
+        return (node_conf.private_ip if node_conf.get("private_ip") else node_conf.public_ip, db_port)
+#}}}
+
+#{{{ Container health
+    def container_health(self, container):
+        """
+        Returns the health status of the given container from the snapshot ('starting', 'healthy' or
+        'unhealthy'), or None if it's unknown. It's taken from the health events (see 'watch_events()')
+        or, if there was no event since the snapshot has been listed, parsed from the 'Status' of the
+        container (e. g. 'Up 2 minutes (healthy)'), because listed containers don't contain 'Health'.
+        """
+        if container.get('Health'):
+            return container['Health']
+        match = re.search(r"\((?:health: )?(starting|healthy|unhealthy)\)", container.get('Status', ''))
+        return match.group(1) if match else None
+#}}}
+
+#{{{ Wait online
+    def wait_online(self, timeout):
+        """
+        Waits until all nodes of the current cluster are serving, i. e. until the healthcheck of their
+        container reports 'healthy' (if the image defines one) or the DB port of the node accepts
+        connections (otherwise). The container state and health status are taken from the container
+        snapshot, which is updated by docker events (see 'get_containers()'). Fails as soon as a
+        container exits or if not all nodes are ready within the given timeout.
+
+        Returns a dict containing the nr. of seconds until each node was ready.
+        """
+
+        start = time.monotonic()
+        deadline = start + timeout
+        try:
+            nodes_conf = self.exaconf.get_nodes()
+            db_configs = self.exaconf.get_databases()
+        except EXAConf.EXAConfError as e:
+            raise DockerError("Failed to read EXAConf: %s" % e)
+        # all databases use the same nodes, so the port of the first one is sufficient
+        db_port = db_configs[list(db_configs)[0]].port if len(db_configs) > 0 else self.exaconf.def_db_port
+        containers = { c['Labels'].get('NodeID') : c for c in self.get_containers() }
+
+        def wait_node(node_id):
+            node_conf = nodes_conf[node_id]
+            if str(node_id) not in containers:
+                raise DockerError("No container found for node '%s'." % node_conf.name)
+            cid = containers[str(node_id)]['Id']
+            try:
+                health = self.client.inspect_container(cid)['State'].get('Health')
+            except docker.errors.APIError as e:
+                raise DockerError("Failed to inspect container: %s" % e)
+            if health:
+                self.update_cached_container(cid, {'Health' : health.get('Status')})
+            address = self.probe_address(node_conf, db_port)
+            while time.monotonic() < deadline:
+                container = [ c for c in self.get_containers() if c['Id'] == cid ]
+                if len(container) == 0 or container[0]['State'] not in ('running', 'restarting'):
+                    raise DockerError("Container exited before the node was ready.")
+                if health:
+                    if self.container_health(container[0]) == 'healthy':
+                        break
+                else:
+                    try:
+                        socket.create_connection(address, timeout = self.ready_poll_interval).close()
+                        break
+                    except OSError:
+                        pass
+                time.sleep(self.ready_poll_interval)
+            else:
+                raise DockerError("Node was not ready within %i seconds." % timeout)
+            ready_time = time.monotonic() - start
+            self.log("Node '%s' is ready (after %.1f seconds)." % (node_conf.name, ready_time))
+            return ready_time
+
+        # waiting does not consume any resources, so all nodes are checked concurrently
+        results = parallel_map(wait_node, list(nodes_conf), max_workers = len(nodes_conf))
+        errors = [ (nodes_conf[nid].name, e) for nid, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("%i node(s) not ready: %s" % (len(errors), self.format_errors(errors)))
+        return { nodes_conf[nid].name : res for nid, res, e in results }
+#}}}
+
 #{{{ Cluster started
     def cluster_started(self):
         """ 
@@ -554,23 +916,65 @@ class docker_handler(object):
         """
 
         try:
-            exaconf_list = []
+            exaconf_files = []
             node_volumes = self.exaconf.get_docker_node_volumes()
             for n,volume in node_volumes.items():
-                node_etc_dir = os.path.join(volume, self.exaconf.etc_dir)
-                if os.path.exists(os.path.join(node_etc_dir, "EXAConf")):
-                    exaconf_list.append(EXAConf.EXAConf(node_etc_dir, True))
-            if len(exaconf_list) > 0:
-                self.exaconf.merge_exaconfs(exaconf_list, allow_self = allow_self, force = force)     
-                self.log("Merged EXAConf from %i node(s)." % len(exaconf_list))
+                node_exaconf = os.path.join(volume, self.exaconf.etc_dir, "EXAConf")
+                if os.path.exists(node_exaconf):
+                    exaconf_files.append(node_exaconf)
+            if len(exaconf_files) > 0:
+                # only read the revisions and node UUIDs (concurrently)
+                # --> only the selected reference is parsed completely
+                results = parallel_map(EXAConf.read_exaconf_summary, exaconf_files, max_workers = self.parallel)
+                errors = [ (f, e) for f, res, e in results if e is not None ]
+                if len(errors) > 0:
+                    raise EXAConf.EXAConfError("Failed to read EXAConf: %s" % self.format_errors(errors))
+                self.exaconf.merge_exaconf_files(exaconf_files, allow_self = allow_self, force = force,
+                                                 summaries = [ res for f, res, e in results ])
+                self.log("Merged EXAConf from %i node(s)." % len(exaconf_files))
         except EXAConf.EXAConfError as e:
             self.log("Error while merging EXAConf: '%s'! Skipping merge." % e)
             return False
         return True
 #}}}
 
+#{{{ Distribute files
+    def distribute_files(self, files):
+        """
+        Copies the given files to all node volumes. 'files' is a list of (source, destination) tuples,
+        where 'destination' is relative to the node volume. The sources are hashed once and a file
+        is only copied if the content of the destination differs (atomically, i. e. by renaming a
+        temporary file). The node volumes are processed concurrently.
+
+        Returns a tuple of the nr. of copied and unchanged files (over all node volumes).
+        """
+
+        sources = [ (src, dest, md5(src), os.stat(src).st_mode & 0o777) for src, dest in files ]
+        def distribute(volume):
+            copied = 0
+            for src, dest, digest, mode in sources:
+                path = os.path.join(volume, dest)
+                os.makedirs(os.path.dirname(path), exist_ok = True)
+                dest_digest = md5(path) if os.path.isfile(path) else None
+                if dest_digest == digest:
+                    continue
+                with open(src, "rb") as s, atomic_file_writer(path, mode = mode, binary = True, digest = dest_digest) as d:
+                    shutil.copyfileobj(s, d)
+                copied += 1
+            return copied
+
+        node_volumes = self.exaconf.get_docker_node_volumes()
+        results = parallel_map(distribute, list(node_volumes.values()), max_workers = self.parallel)
+        errors = [ (volume, e) for volume, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to copy files to %i node volume(s): %s" % (len(errors), self.format_errors(errors)))
+        copied = sum(res for volume, res, e in results)
+        return (copied, len(sources) * len(results) - copied)
+#}}}
+
 #{{{ Start cluster
-    def start_cluster(self, cmd=None, auto_remove=False, dummy_mode=False, wait=False, wait_timeout=None):
+    def start_cluster(self, cmd=None, auto_remove=False, dummy_mode=False, wait=False, wait_timeout=None,
+                      wait_online=False, wait_online_timeout=600):
         """
         Starts the given cluster by:
             - checking the available free space (in case of file-devices)
@@ -582,6 +986,8 @@ class docker_handler(object):
         and started. This can be used to execute arbitrary commands in the containers. If 'auto_remove'
         is also true, these containers will be removed by Docker as soon as the container process exits.
         If 'wait' is true, this function will wait 'wait_timeout' seconds for the containers to stop.
+        If 'wait_online' is true, this function will wait (max. 'wait_online_timeout' seconds) until all nodes
+        are serving (see 'wait_online()') and print the time it took for each node.
         """
 
         networks = None
@@ -598,7 +1004,7 @@ class docker_handler(object):
             # 1. check free space in case of file-devices
             if self.exaconf.get_device_type() == "file":
                 dh = device_handler.device_handler(self.exaconf)
-                if dh.check_free_space() == False:
+                if dh.check_free_space(quiet = self.quiet) == False:
                     raise DockerError("Check for space usage failed! Aborting startup.")
       
             # 2. merge EXAConf copies and copy necessary files
@@ -606,23 +1012,19 @@ class docker_handler(object):
             if self.merge_exaconf(allow_self = True, force = False) is True:
                 # copy EXAConf and license to all node volumes
                 conf_path = self.exaconf.get_conf_path()
-                license = self.exaconf.get_license_file()
-                node_volumes = self.exaconf.get_docker_node_volumes()
-                self.log("Copying EXAConf and license to all node volumes.")
-                for n,volume in node_volumes.items():
-                    shutil.copy(conf_path, os.path.join(volume, self.exaconf.etc_dir))
-                    shutil.copy(license, os.path.join(volume, self.exaconf.etc_dir, self.exaconf.license_filename))
+                files = [ (conf_path, os.path.join(self.exaconf.etc_dir, os.path.basename(conf_path))),
+                          (self.exaconf.get_license_file(), os.path.join(self.exaconf.etc_dir, self.exaconf.license_filename)) ]
                 # copy SSL files (if they exist)
                 try:
                     ssl_conf = self.exaconf.get_ssl_conf()
-                    if "cert" in ssl_conf and os.path.isfile(ssl_conf.cert):
-                        shutil.copy(ssl_conf.cert, os.path.join(volume, self.exaconf.ssl_dir))
-                    if "cert_key" in ssl_conf and os.path.isfile(ssl_conf.cert_key):
-                        shutil.copy(ssl_conf.cert_key, os.path.join(volume, self.exaconf.ssl_dir))
-                    if "cert_auth" in ssl_conf and os.path.isfile(ssl_conf.cert_auth):
-                        shutil.copy(ssl_conf.cert_auth, os.path.join(volume, self.exaconf.ssl_dir))
+                    for ssl_file in (ssl_conf.cert, ssl_conf.cert_key, ssl_conf.cert_auth):
+                        if os.path.isfile(ssl_file):
+                            files.append((ssl_file, os.path.join(self.exaconf.conf_ssl_dir, os.path.basename(ssl_file))))
                 except EXAConf.EXAConfError as e:
                     print("Skipping SSL configuration (not present in EXAConf).")
+                self.log("Copying EXAConf, license and SSL files to all node volumes.")
+                copied, unchanged = self.distribute_files(files)
+                self.log("Copied %i file(s) (%i unchanged)." % (copied, unchanged))
             else:
                 self.log("Not copying EXAConf (and referenced files) because EXAConf merge failed!")
 
@@ -651,7 +1053,15 @@ class docker_handler(object):
             self.stop_cluster(30)            
             raise e
 
-        # 6. wait for containers to stop
+        # 6. wait for nodes to be ready
+        if wait_online is True:
+            ready_times = self.wait_online(wait_online_timeout)
+            width = max([len("NODE")] + [ len(n) for n in ready_times ])
+            self.log("%-*s   %s" % (width, "NODE", "READY AFTER (s)"))
+            for name, ready_time in sorted(ready_times.items()):
+                self.log("%-*s   %15.1f" % (width, name, ready_time))
+
+        # 7. wait for containers to stop
         if wait is True:
             for c in containers:
                 try:
@@ -663,29 +1073,24 @@ class docker_handler(object):
 #}}}
 
 #{{{ Stop cluster
-    def stop_cluster(self, timeout):
+    def stop_cluster(self, timeout, compress_logs=False):
         """
         Stops the given cluster by:
-            - stopping all running docker containers
-            - removing all stopped docker containers
+            - stopping all running docker containers (concurrently, within the given timeout)
+            - saving the logs of each container (gzip compressed if 'compress_logs' is true)
+              and removing it (as soon as it has exited)
+            - merging the EXAConf copies of all nodes
             - removing all docker networks
         """
         ex = None
         try:
-            stopped = self.stop_containers(timeout)
+            self.shutdown_containers(timeout, compress_logs = compress_logs)
         except Exception as e:
             print("Error during shutdown: %s! Continueing anyway..." % e)
             ex = e
-        # save logs and merge EXAConf before removing containers
-        # NOTE : merging is also done within exadt
-        self.save_logs()
+        # NOTE : merging is also done within exadt (the node volumes still exist
+        # after the containers have been removed)
         self.merge_exaconf(allow_self = False, force = True)
-        try:
-            if stopped:
-                self.remove_containers()
-        except DockerError as e:
-            print("Error during shutdown! Continueing anyway...")
-            ex = e
         try:
             self.delete_networks()
         except DockerError as e:
@@ -695,41 +1100,123 @@ class docker_handler(object):
             raise ex
 #}}}
  
+#{{{ Read logs checkpoint
+    def read_logs_checkpoint(self, checkpoint_file, container_id):
+        """
+        Returns the time (in seconds since the epoch) up to which the logs of the given container
+        have already been saved, or None if there is no (valid) checkpoint for this container.
+        """
+        try:
+            with open(checkpoint_file) as f:
+                cid, since = f.read().split()
+            if cid == container_id and int(since) > 0:
+                return int(since)
+        except (IOError, ValueError):
+            pass
+        return None
+#}}}
+
+#{{{ Save container logs
+    def save_container_logs(self, container, compress=False):
+        """
+        Streams the output of 'docker logs' of the given container into '/exa/logs/docker/' (chunk by chunk,
+        gzip compressed if 'compress' is true). A checkpoint file next to the log file contains the ID of the
+        container and the time of the last download: if the logs of the same container are saved again,
+        only the new output is downloaded and appended. Otherwise, the existing log file is rotated.
+        NOTE : this only helps if the logs of a running container are saved repeatedly (e. g. by
+        'exadt collect-info'). Containers are recreated by each 'start-cluster', so the logs saved
+        by 'stop-cluster' are always rotated (the new container only returns its own output anyway).
+        Can be called concurrently for different containers. Errors are printed but not raised.
+        """
+        host_path = self.container_path(container)
+        if not host_path:
+            return
+        current_file = os.path.join(host_path, self.exaconf.docker_log_dir, self.exaconf.docker_logs_filename)
+        if compress:
+            current_file += ".gz"
+        checkpoint_file = current_file + ".checkpoint"
+        since = self.read_logs_checkpoint(checkpoint_file, container['Id'])
+        if since is not None and not os.path.exists(current_file):
+            since = None
+        # logs are downloaded up to the beginning of the current second
+        # (the next download continues from there)
+        until = int(time.time())
+        try:
+            try:
+                logs = self.client.logs(container, stderr=True, stdout=True, timestamps=False, stream=True, follow=False,
+                                        **({'since': since, 'until': until} if since else {'until': until}))
+            except docker.errors.InvalidVersion:
+                # 'until' is not supported by the docker service --> no checkpoint
+                since = until = None
+                logs = self.client.logs(container, stderr=True, stdout=True, timestamps=False, stream=True, follow=False)
+            if since is None:
+                rotate_file(current_file, self.exaconf.docker_max_logs_copies)
+                if os.path.exists(checkpoint_file):
+                    os.remove(checkpoint_file)
+                prev_size = None
+            else:
+                prev_size = os.path.getsize(current_file)
+            # appending to a gzip file adds a new gzip member
+            # --> if the download fails, the appended data is removed again, so the
+            #     file matches the (unchanged) checkpoint
+            mode = "ab" if since else "wb"
+            try:
+                with (gzip.open(current_file, mode) if compress else open(current_file, mode)) as current_logs:
+                    for chunk in logs:
+                        current_logs.write(chunk)
+            except Exception:
+                if prev_size is not None:
+                    os.truncate(current_file, prev_size)
+                raise
+            # the checkpoint is only written after a complete download (and removed
+            # if that fails, so the next download doesn't append the same output again)
+            if until is not None:
+                try:
+                    with atomic_file_writer(checkpoint_file) as f:
+                        f.write("%s %i\n" % (container['Id'], until))
+                except (IOError, OSError):
+                    if os.path.exists(checkpoint_file):
+                        os.remove(checkpoint_file)
+                    raise
+        except docker.errors.APIError as e:
+            print("Failed to retrieve docker logs from container '%s' : %s" % (self.container_name(container), e))
+        except (IOError, OSError) as e:
+            print("Failed to write docker logs to '%s': %s" % (current_file, e))
+#}}}
+
 #{{{ Save logs
-    def save_logs(self):
+    def save_logs(self, compress=False):
         """
-        Stores the output of 'docker logs' within '/exa/logs/docker/'.
+        Stores the output of 'docker logs' within '/exa/logs/docker/' (for all containers concurrently).
         """
         containers = self.get_containers(all = True)
-        for container in containers:
-            host_path = self.container_path(container)
-            if host_path:
-                try:
-                    logs = self.client.logs(container, stderr=True, stdout=True, timestamps=False)
-                    current_file = os.path.join(host_path, self.exaconf.docker_log_dir, self.exaconf.docker_logs_filename)
-                    rotate_file(current_file, self.exaconf.docker_max_logs_copies)
-                    with open(current_file, "wb") as current_logs:
-                        current_logs.write(logs)
-                except docker.errors.APIError as e:
-                    print("Failed to retrieve docker logs from container '%s' : %s" % (self.container_name(container), e))
-                except IOError as e:
-                    print("Failed to write docker logs to '%s': %s" % (current_file, e))
+        parallel_map(lambda c: self.save_container_logs(c, compress = compress), containers, max_workers = self.parallel)
 #}}}
  
-#{{{ Execute container
-    def execute_container(self, cmd, container, stdin=False, tty=False, quiet=False):
+#{{{ Node name
+    def node_name(self, container):
         """
-        Executes the given command in the given container.
+        Returns the name of the node that is running in the given container
+        (the label changed in 6.0.1 from "Hostname" to "Name"), or the container name.
         """
-
-        # Retrieve node name (Label changed in 6.0.1 from "Hostname" to "Name")
-        # or use container name instead
-        node_name = container['Names'][0].lstrip("/")
         if 'Hostname' in container['Labels']:
-            node_name =  container['Labels']['Hostname']
+            return container['Labels']['Hostname']
         elif 'Name' in container['Labels']:
-            node_name =  container['Labels']['Name']
-                                                              
+            return container['Labels']['Name']
+        return self.container_name(container)
+#}}}
+
+#{{{ Execute container
+    def execute_container(self, cmd, container, stdin=False, tty=False, quiet=False, prefix=None):
+        """
+        Executes the given command in the given container. If 'prefix' is given, the output
+        is printed line by line with the given prefix (so the output of concurrent executions
+        can be distinguished).
+
+        Returns the exit code of the command.
+        """
+
+        node_name = self.node_name(container)
         # This local 'quiet' only suppresses the additional output, not the one from the command (like 'self.quiet')!
         if not quiet:
             self.log("=== Executing '%s' in container '%s' ===" % (cmd, node_name))
@@ -742,27 +1229,45 @@ class docker_handler(object):
         except docker.errors.APIError as e:
             raise DockerError("Failed to start exec instance for command '%s': %s" % (cmd, e))
 
+        output = output_logger(self.log, prefix)
         for val in res:
-            self.log(val.decode())
+            output.write(val)
+        output.close()
+
+        try:
+            return self.client.exec_inspect(exi)['ExitCode']
+        except docker.errors.APIError as e:
+            raise DockerError("Failed to inspect exec instance for command '%s': %s" % (cmd, e))
 #}}}
 
 #{{{ Execute
     def execute(self, cmd, all=False, stdin=False, tty=False, quiet=False):
         """
         Executes the given command either on a single (random) running container or all running containers (if 'all' == True).
+        In the latter case, the command is executed on up to 'self.parallel' containers concurrently and each line of
+        output is prefixed with the node name.
+
+        Returns a dict containing the exit code of the command for each node (empty if there are no running containers).
         """
         
-        success = False
-        containers = self.get_containers(all=False)
-        for container in containers:
-            if container['State'] == 'running':
-                self.execute_container(cmd, container, stdin=stdin, tty=tty, quiet=quiet)
-                success = True
-                if all == False:
-                    break
-
-        if not success:
+        containers = [ c for c in self.get_containers(all=False) if c['State'] == 'running' ]
+        if len(containers) == 0:
             self.log("No running containers found for the given cluster.")
+            return {}
+        if all == False:
+            containers = containers[:1]
+
+        if len(containers) == 1:
+            return { self.node_name(containers[0]) : self.execute_container(cmd, containers[0], stdin=stdin, tty=tty, quiet=quiet) }
+
+        width = max(len(self.node_name(c)) for c in containers)
+        results = parallel_map(lambda c: self.execute_container(cmd, c, stdin=stdin, tty=tty, quiet=quiet,
+                                                                prefix="[%-*s] " % (width, self.node_name(c))),
+                               containers, max_workers = self.parallel)
+        errors = [ (self.node_name(c), e) for c, res, e in results if e is not None ]
+        if len(errors) > 0:
+            raise DockerError("Failed to execute '%s' on %i node(s): %s" % (cmd, len(errors), self.format_errors(errors)))
+        return { self.node_name(c) : res for c, res, e in results }
 #}}}
 
 #{{{ Run
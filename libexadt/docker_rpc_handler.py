@@ -1,4 +1,6 @@
+import time
 from . import rpc_handler, docker_handler
+from .util import parallel_map
 
 class docker_rpc_handler(rpc_handler.rpc_handler):
     """
@@ -6,24 +8,45 @@ class docker_rpc_handler(rpc_handler.rpc_handler):
     """
 
 #{{{ Init
-    def __init__(self, exaconf, quiet=False, dh=None):
+    def __init__(self, exaconf, quiet=False, dh=None, parallel=None):
         """
         Creates a new docker_rpc_handler (which creates a new docker_handler if not given).
+        'parallel' is the max. nr. of databases that are started / stopped concurrently
+        (only used for the new docker_handler).
         """
         rpc_handler.rpc_handler.__init__(self, exaconf, "NULL", quiet=quiet)
         self.dh = dh
+        self._container = None
         if not self.dh:
             try:
-                self.dh = docker_handler.docker_handler(quiet=quiet)
+                self.dh = docker_handler.docker_handler(quiet=quiet, parallel=parallel)
                 self.dh.set_exaconf(self.exaconf)
             except docker_handler.DockerError as e:
                 raise e
 #}}}
 
-#{{{ Stop database
-    def stop_database(self, name="all"):
+#{{{ Get container
+    def get_container(self):
+        """
+        Returns the running container that is used for executing all commands
+        (it's only determined once).
         """
-        Stops all databases (or the given one) in the current cluster.
+        if self._container is None:
+            containers = [ c for c in self.dh.get_containers(all=False) if c['State'] == 'running' ]
+            if len(containers) == 0:
+                raise docker_handler.DockerError("No running containers found for cluster '%s'." % self.dh.cluster_name)
+            self._container = containers[0]
+        return self._container
+#}}}
+
+#{{{ Database operation
+    def database_operation(self, operation, name="all"):
+        """
+        Executes 'dwad_client <operation> <database>' for all databases (or the given one). The databases
+        are independent, so the commands are executed concurrently (up to 'self.dh.parallel' at once)
+        in the same container. Prints the result and duration for each database.
+
+        Returns True if the operation succeeded for all databases.
         """
 
         filters = None
@@ -37,56 +60,59 @@ class docker_rpc_handler(rpc_handler.rpc_handler):
             else:
                 self.log("Could not find database '%s'!" % name)
             return False
-        
-        for db in db_configs:
-            self.dh.execute("dwad_client stop-wait %s" % db, quiet=True)
-        return True
+
+        container = self.get_container()
+        def run_operation(db):
+            start = time.monotonic()
+            prefix = "[%s] " % db if len(db_configs) > 1 else None
+            try:
+                exit_code = self.dh.execute_container("dwad_client %s %s" % (operation, db), container, quiet=True, prefix=prefix)
+                result = "OK" if exit_code == 0 else "FAILED (%s)" % exit_code
+                error = None
+            except docker_handler.DockerError as e:
+                result = "ERROR"
+                error = e
+            return (result, time.monotonic() - start, error)
+
+        results = parallel_map(run_operation, list(db_configs), max_workers = self.dh.parallel)
+        width = max([len("DATABASE")] + [ len(db) for db in db_configs ])
+        self.log("%-*s   %-12s   %-12s   %8s" % (width, "DATABASE", "OPERATION", "RESULT", "TIME (s)"))
+        for db, (result, duration, error), e in results:
+            self.log("%-*s   %-12s   %-12s   %8.1f" % (width, db, operation, result, duration))
+        for db, (result, duration, error), e in results:
+            if error is not None:
+                self.log("Database '%s': %s" % (db, error))
+        return all(res[0] == "OK" for db, res, e in results)
+#}}}
+
+#{{{ Stop database
+    def stop_database(self, name="all"):
+        """
+        Stops all databases (or the given one) in the current cluster. The databases are
+        processed concurrently (see 'database_operation()').
+        """
+
+        return self.database_operation("stop-wait", name)
 #}}}
  
 #{{{ Kill database
     def kill_database(self, name="all"):
         """
-        Immediately force-stops all databases (or the given one) in the current cluster.
+        Immediately force-stops all databases (or the given one) in the current cluster. The databases are
+        processed concurrently (see 'database_operation()').
         """
 
-        filters = None
-        if name != "all":
-            filters = {"name": name}
-        db_configs = self.exaconf.get_databases(filters=filters)
-
-        if len(db_configs) == 0:
-            if name == 'all':
-                self.log("No databases found.")
-            else:
-                self.log("Could not find database '%s'!" % name)
-            return False
-        
-        for db in db_configs:
-            self.dh.execute("dwad_client stop-force %s" % db, quiet=True)
-        return True
+        return self.database_operation("stop-force", name)
 #}}}
  
 #{{{ Start database
     def start_database(self, name="all"):
         """
-        Starts all databases (or the given one) in the current cluster.
+        Starts all databases (or the given one) in the current cluster. The databases are
+        processed concurrently (see 'database_operation()').
         """
 
-        filters = None
-        if name != "all":
-            filters = {"name": name}
-        db_configs = self.exaconf.get_databases(filters=filters)
- 
-        if len(db_configs) == 0:
-            if name == 'all':
-                self.log("No databases found.")
-            else:
-                self.log("Could not find database '%s'!" % name)
-            return False
-        
-        for db in db_configs:
-            self.dh.execute("dwad_client start-wait %s" % db, quiet=True)
-        return True
+        return self.database_operation("start-wait", name)
 #}}}
          
 #{{{ List databases
@@ -96,9 +122,9 @@ class docker_rpc_handler(rpc_handler.rpc_handler):
         """
 
         if short == True:
-            self.dh.execute("dwad_client shortlist", quiet=True)
+            self.dh.execute_container("dwad_client shortlist", self.get_container(), quiet=True)
         else:
-            self.dh.execute("dwad_client list", quiet=True)
+            self.dh.execute_container("dwad_client list", self.get_container(), quiet=True)
         return True
 #}}}
 
@@ -1,6 +1,7 @@
 #! /usr/bin/env python3
 
-import re, base64, string, random, os, subprocess, time, shutil, hashlib, uuid, crypt, tempfile
+import re, base64, string, random, os, subprocess, time, shutil, hashlib, tempfile
+import collections
 from subprocess import Popen, PIPE
 from typing import Optional
 from types import ModuleType
@@ -15,10 +16,23 @@ except ImportError:
 shadow_prefixes = ['$1$', '$2a$', '$2y$', '$5$', '$6$']
  
 class atomic_file_writer(object): #{{{
-    def __init__(self, path, mode = 0o644, uid = None, gid = None):
+    """
+    Writes a file atomically: the content is written to a temporary file in the same
+    directory, which is synced to disk and renamed to the given path on close (followed
+    by a sync of the directory). The temporary file is removed if the content is identical
+    to the existing file or if an exception is raised within a 'with' block.
+
+    If the MD5 digest of the existing file is known, it can be given as 'digest', so the
+    existing file does not have to be read for the comparison. 'digest()' returns the MD5
+    digest of the new content.
+    """
+    def __init__(self, path, mode = 0o644, uid = None, gid = None, binary = False, digest = None):
         self._path = os.path.abspath(path)
         self._is_duplicate = False
-        self._temp = tempfile.NamedTemporaryFile(mode = 'w',
+        self._prev_digest = digest
+        self._md5 = hashlib.md5()
+        self._binary = binary
+        self._temp = tempfile.NamedTemporaryFile(mode = 'wb' if binary else 'w',
                                                  prefix = '.%s.' % os.path.basename(self._path),
                                                  dir = os.path.dirname(self._path),
                                                  delete = False)
@@ -30,31 +44,76 @@ class atomic_file_writer(object): #{{{
     def __getattr__(self, name):
         return getattr(self._temp, name)
 
+    def write(self, data):
+        self._md5.update(data if self._binary else data.encode(self._temp.encoding))
+        return self._temp.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def digest(self):
+        return self._md5.hexdigest()
+
     def close(self):
+        if self._temp.closed:
+            return
+        self._temp.flush()
+        os.fsync(self._temp.fileno())
         self._temp.close()
         self._is_duplicate = False
         if os.path.exists(self._path):
-            prev_cont = open(self._path).read()
-            new_cont = open(self._temp.name).read()
-            if prev_cont == new_cont:
+            if self._prev_digest is None:
+                self._prev_digest = md5(self._path)
+            if self._prev_digest == self.digest():
                 self._is_duplicate = True
         if not self._is_duplicate:
             os.rename(self._temp.name, self._path)
+            fsync_dir(os.path.dirname(self._path))
         else: os.unlink(self._temp.name)
 
+    def discard(self):
+        """
+        Removes the temporary file without touching the destination.
+        """
+        if not self._temp.closed:
+            self._temp.close()
+        if os.path.exists(self._temp.name):
+            os.unlink(self._temp.name)
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+        if exc_type is not None:
+            self.discard()
+        else:
+            self.close()
 
     def ignored(self):
         return self._is_duplicate    
 # }}}
 
+def fsync_dir(path): #{{{
+    """
+    Syncs the given directory to disk (makes renames within that directory persistent).
+    """
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0))
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        # not supported by all filesystems
+        pass
+    finally:
+        os.close(fd)
+#}}}
+
 def read_exaconf(filename, ro = False, initialized = False): #{{{
     """
-    Checks and reads the given EXAConf file.
+    Checks and reads the given EXAConf file (without writing a cache file if 'ro' is true).
     """
     try:
         from EXAConf import EXAConf, EXAConfError
@@ -68,7 +127,8 @@ def read_exaconf(filename, ro = False, initialized = False): #{{{
         raise EXAConfError("EXAConf file '%s' is not readable by the current user!" % filename)
     if not ro and not os.access(filename, os.W_OK):
         raise EXAConfError("EXAConf file '%s' is not writable by the current user!" % filename)
-    exaconf = EXAConf(os.path.dirname(filename), False, filename=os.path.basename(filename))
+    exaconf = EXAConf(os.path.dirname(filename), False, filename=os.path.basename(filename),
+                      use_cache = "ro" if ro else True)
     if initialized and not exaconf.initialized():
         raise EXAConfError("EXAConf in '%s' is not inizalized!" % filename)
     return exaconf
@@ -401,6 +461,128 @@ def rotate_file(current, max_copies): #{{{
         shutil.copy(current, previous % 0)
 #}}}
 
+class parallel_gzip_writer(object): #{{{
+    """
+    A write-only file object that compresses the written data in parallel: the data is split
+    into blocks of 'block_size' bytes and each block is compressed into a separate gzip member
+    by a pool of 'max_workers' threads. The members are written to 'fileobj' in the original
+    order, i. e. the result is a valid (multi-member) gzip file. At most '2 * max_workers'
+    blocks are kept in memory. 'fileobj' is flushed but not closed on close.
+    """
+    def __init__(self, fileobj, max_workers = 4, block_size = 4 * 1024 * 1024, compresslevel = 6):
+        # imported here, because they are only needed when writing logs
+        import concurrent.futures, gzip
+        self._compress = gzip.compress
+        self._fileobj = fileobj
+        self._block_size = block_size
+        self._compresslevel = compresslevel
+        self._max_pending = 2 * max(1, max_workers)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers = max(1, max_workers))
+        self._pending = collections.deque()
+        self._buffer = bytearray()
+        self._num_members = 0
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _submit(self, block):
+        self._pending.append(self._executor.submit(self._compress, block, self._compresslevel))
+        self._num_members += 1
+        while len(self._pending) > self._max_pending:
+            self._fileobj.write(self._pending.popleft().result())
+
+    def write(self, data):
+        self._buffer += data
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            # an empty input still results in a (single) valid gzip member
+            if len(self._buffer) > 0 or self._num_members == 0:
+                self._submit(bytes(self._buffer))
+            while len(self._pending) > 0:
+                self._fileobj.write(self._pending.popleft().result())
+            self._fileobj.flush()
+        finally:
+            self._executor.shutdown()
+#}}}
+
+class fixed_size_reader(object): #{{{
+    """
+    A read-only file object that returns exactly 'size' bytes of 'fileobj'. If the file ends
+    early (e. g. a log file that has been truncated in the meantime) or can't be read anymore,
+    the remaining data is padded with NULs. Read errors are not raised but stored in 'error'.
+    """
+    def __init__(self, fileobj, size):
+        self.fileobj = fileobj
+        self.remaining = size
+        self.error = None
+
+    def read(self, size = -1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = b""
+        if self.error is None:
+            try:
+                data = self.fileobj.read(size)
+            except OSError as e:
+                self.error = e
+        self.remaining -= size
+        return data + b"\0" * (size - len(data))
+#}}}
+
+def parallel_map(func, items, max_workers = 8, stop_on_error = False): #{{{
+    """
+    Calls 'func(item)' for all given items, using a pool of at most 'max_workers' threads
+    (the items are processed serially if 'max_workers' is 1 or less).
+
+    Returns a list of (item, result, exception) tuples in the order of the given items.
+    Exceptions raised by 'func' are not propagated but returned together with the item
+    ('exception' is None on success). If 'stop_on_error' is true, items that have not
+    been started when the first error occurs are skipped (and not part of the result).
+    """
+
+    items = list(items)
+    results = {}
+    if max_workers <= 1 or len(items) <= 1:
+        for num, item in enumerate(items):
+            try:
+                results[num] = (item, func(item), None)
+            except Exception as e:
+                results[num] = (item, None, e)
+                if stop_on_error:
+                    break
+    else:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers = min(max_workers, len(items))) as executor:
+            futures = { executor.submit(func, item) : num for num, item in enumerate(items) }
+            for future in concurrent.futures.as_completed(futures):
+                if future.cancelled():
+                    continue
+                num = futures[future]
+                try:
+                    results[num] = (items[num], future.result(), None)
+                except Exception as e:
+                    results[num] = (items[num], None, e)
+                    if stop_on_error:
+                        for f in futures:
+                            f.cancel()
+    return [ results[num] for num in sorted(results) ]
+#}}}
+
 def md5(filename): #{{{
     """
     Returns the MD5 sum of the given file.
@@ -417,6 +599,7 @@ def gen_node_uuid(): #{{{
     """
     Generates a UUID for EXASOL cluster nodes (40 chars long). 
     """
+    import uuid
     return (uuid.uuid4().hex + uuid.uuid4().hex)[:40].upper()
 #}}}
 
@@ -424,6 +607,7 @@ def encode_shadow_passwd(passwd): #{{{
     """
     Encodes the given passwd into an /etc/shadow compatible SHA512 hash.
     """
+    import crypt
     return crypt.crypt(passwd, "$6$"+base64.b64encode(os.urandom(16)).decode()+"$")
 #}}}
 
@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+"""
+Benchmark for 'EXAConf.commit()': prints the avg. commit time depending on the nr.
+of sections in EXAConf (increased by adding nodes), both for commits without any
+changes and for commits of a modified configuration (i. e. a new revision is
+serialized, written and added to the revision journal).
+
+The 'legacy' columns emulate the former commit path (serializing for the
+checksum, writing with ConfigObj and reloading the written file).
+"""
+
+import sys, os, argparse, tempfile, shutil, time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from libexadt import EXAConf
+
+# the default private network (/24) can hold nodes with IDs 11 to 254
+max_nodes = 244
+timezones = ("Europe/Berlin", "Europe/Paris")
+
+# {{{ Legacy commit
+def legacy_commit(exaconf):
+    exaconf.compute_checksum()
+    exaconf.config.write()
+    exaconf.config.reload()
+# }}}
+# {{{ Change
+def change(exaconf, num):
+    """
+    Modifies the configuration (so the next commit creates a new revision).
+    """
+    exaconf.set_timezone(timezones[num % 2])
+# }}}
+# {{{ Time it
+def time_it(func, iterations, prepare = None):
+    """
+    Returns the avg. time of 'func()'. If 'prepare' is given, 'prepare(num)' is called
+    before each call of 'func()' (not included in the measured time).
+    """
+    duration = 0.0
+    for num in range(iterations):
+        if prepare is not None:
+            prepare(num)
+        start = time.perf_counter()
+        func()
+        duration += time.perf_counter() - start
+    return duration / iterations
+# }}}
+# {{{ Main
+def main():
+    parser = argparse.ArgumentParser(
+            description = 'Benchmark EXAConf commits',
+            prog = 'bench_exaconf_commit.py')
+    parser.add_argument(
+            '--nodes', '-n',
+            type = str,
+            default = "1,8,32,128,%i" % max_nodes,
+            help = 'Comma separated list of node numbers (default: 1,8,32,128,%i, max: %i)' % (max_nodes, max_nodes))
+    parser.add_argument(
+            '--iterations', '-i',
+            type = int,
+            default = 20,
+            help = 'Nr. of commits per measurement (default: 20)')
+    cmd = parser.parse_args()
+    node_nums = [ int(n) for n in cmd.nodes.split(",") if n.strip() != "" ]
+    if any(n < 1 or n > max_nodes for n in node_nums):
+        parser.error("node numbers have to be between 1 and %i" % max_nodes)
+
+    print(" %8s   %8s   %12s   %12s   %12s   %12s" % ("NODES", "SECTIONS", "COMMIT (ms)", "CHANGED (ms)",
+                                                      "LEGACY (ms)", "LEG. CHG (ms)"))
+    for num_nodes in node_nums:
+        root = tempfile.mkdtemp()
+        try:
+            exaconf = EXAConf.EXAConf(root, False)
+            exaconf.initialize("bench", "exasol/docker-db:latest", num_nodes, "file", False, "Docker",
+                               license = os.path.join(root, "license.xml"), quiet = True)
+            commit_time = time_it(exaconf.commit, cmd.iterations)
+            changed_time = time_it(exaconf.commit, cmd.iterations, lambda num: change(exaconf, num))
+            legacy_time = time_it(lambda: legacy_commit(exaconf), cmd.iterations)
+            legacy_changed_time = time_it(lambda: legacy_commit(exaconf), cmd.iterations, lambda num: change(exaconf, num))
+            print(" %8i   %8i   %12.3f   %12.3f   %12.3f   %12.3f" % (num_nodes, len(exaconf.config.sections),
+                                                                    commit_time * 1000, changed_time * 1000,
+                                                                    legacy_time * 1000, legacy_changed_time * 1000))
+        finally:
+            shutil.rmtree(root, True)
+
+if __name__ == '__main__':
+    main()
+# }}}
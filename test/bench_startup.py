@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+"""
+Benchmark for the startup time of 'exadt' and 'exaconf': runs each command several
+times, prints the median wall-clock time and the most expensive imports (based on
+'python -X importtime'). Exits with 1 if a median exceeds the given budget.
+
+The budget applies to the overhead compared to starting the interpreter without any
+script (i. e. the median of 'python -c pass'), so it doesn't depend on the speed of
+the machine and the site packages that are loaded on every start.
+"""
+
+import sys, os, argparse, subprocess, time, statistics, tempfile, shutil
+
+root_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+# {{{ Run it
+def run_it(cmd, env):
+    """
+    Executes the given command once and returns the wall-clock time (in seconds)
+    and the output of '-X importtime' (i. e. stderr).
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime"] + cmd,
+                          stdout = subprocess.DEVNULL, stderr = subprocess.PIPE,
+                          env = env, universal_newlines = True)
+    duration = time.perf_counter() - start
+    if proc.returncode != 0:
+        print("Command '%s' failed:\n%s" % (" ".join(cmd), proc.stderr))
+        sys.exit(1)
+    return (duration, proc.stderr)
+# }}}
+# {{{ Parse importtime
+def parse_importtime(output):
+    """
+    Returns a list of (cumulative time in us, module name) tuples.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        imports.append((int(fields[1]), fields[2].strip()))
+    return imports
+# }}}
+# {{{ Main
+def main():
+    parser = argparse.ArgumentParser(
+            description = 'Benchmark the startup time of exadt and exaconf',
+            prog = 'bench_startup.py')
+    parser.add_argument(
+            '--iterations', '-i',
+            type = int,
+            default = 10,
+            help = 'Nr. of runs per command (default: 10)')
+    parser.add_argument(
+            '--budget', '-b',
+            type = float,
+            default = 120.0,
+            help = 'Max. median overhead per command in ms, compared to the interpreter startup (default: 120)')
+    parser.add_argument(
+            '--top', '-t',
+            type = int,
+            default = 5,
+            help = 'Nr. of most expensive imports to show (default: 5)')
+    cmd = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp()
+    env = dict(os.environ)
+    env["HOME"] = tmp_dir
+    env["PYTHONPATH"] = os.pathsep.join([root_dir] + [ p for p in [env.get("PYTHONPATH")] if p ])
+    commands = [ [os.path.join(root_dir, "exadt"), "version"],
+                 [os.path.join(root_dir, "exadt"), "list-clusters"],
+                 [os.path.join(root_dir, "exaconf"), "version"] ]
+    over_budget = False
+    try:
+        interpreter = statistics.median(run_it(["-c", "pass"], env)[0] for _ in range(cmd.iterations)) * 1000
+        print("interpreter: %.1f ms" % interpreter)
+        for c in commands:
+            runs = [ run_it(c, env) for _ in range(cmd.iterations) ]
+            median = statistics.median(r[0] for r in runs) * 1000
+            overhead = median - interpreter
+            status = "OK" if overhead <= cmd.budget else "OVER BUDGET"
+            over_budget = over_budget or overhead > cmd.budget
+            print("%s: %.1f ms (overhead: %.1f ms, budget: %.1f ms) %s" % (" ".join(os.path.basename(a) for a in c[:2]),
+                                                                         median, overhead, cmd.budget, status))
+            for cumulative, name in sorted(parse_importtime(runs[-1][1]), reverse = True)[:cmd.top]:
+                print("    %8.1f ms   %s" % (cumulative / 1000.0, name))
+    finally:
+        shutil.rmtree(tmp_dir, True)
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == '__main__':
+    main()
+# }}}
@@ -0,0 +1,208 @@
+#! /usr/bin/env python3
+"""
+Fake Docker Engine API server for testing 'async_docker_handler' without a docker service.
+Listens on a unix socket and keeps containers and exec instances in memory. Only the
+endpoints used by the handler are implemented. Can be used as a module:
+
+    server = fake_engine_api("/tmp/docker.sock")
+    await server.start()
+    ...
+    await server.stop()
+
+or started from the command line (runs until interrupted):
+
+    fake_engine_api.py --socket /tmp/docker.sock [--latency 0.05]
+"""
+
+import os, re, json, struct, asyncio, argparse, uuid
+from urllib.parse import urlsplit, parse_qs, unquote
+
+# {{{ Default exec handler
+def default_exec_handler(container, cmd):
+    """
+    Returns the output (i. e. the command itself) and the exit code (always 0) of an exec instance.
+    """
+    return ((" ".join(cmd) + "\n").encode(), 0)
+# }}}
+
+class fake_engine_api(object):
+    """
+    In-memory implementation of a subset of the Docker Engine API.
+    """
+
+    api_version = "1.41"
+
+# {{{ Init
+    def __init__(self, socket_path, latency=0.0, exec_handler=default_exec_handler):
+        """
+        'latency' is the delay (in seconds) of every request and 'exec_handler(container, cmd)'
+        returns the output (bytes) and the exit code of an exec instance.
+        """
+        self.socket_path = socket_path
+        self.latency = latency
+        self.exec_handler = exec_handler
+        self.containers = {}
+        self.execs = {}
+        self.requests = []
+        self.server = None
+        self.routes = [("GET", r"/version", self.get_version),
+                       ("GET", r"/containers/json", self.list_containers),
+                       ("POST", r"/containers/create", self.create_container),
+                       ("POST", r"/containers/([^/]+)/start", self.start_container),
+                       ("POST", r"/containers/([^/]+)/stop", self.stop_container),
+                       ("DELETE", r"/containers/([^/]+)", self.remove_container),
+                       ("POST", r"/networks/([^/]+)/connect", self.connect_network),
+                       ("POST", r"/containers/([^/]+)/exec", self.create_exec),
+                       ("POST", r"/exec/([^/]+)/start", self.start_exec),
+                       ("GET", r"/exec/([^/]+)/json", self.inspect_exec)]
+# }}}
+# {{{ Start / stop
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self.handle, path = self.socket_path)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+# }}}
+# {{{ Handle
+    async def handle(self, reader, writer):
+        """
+        Reads a single request, dispatches it and closes the connection.
+        """
+        try:
+            method, target, _ = (await reader.readline()).decode().split(" ", 2)
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode().strip()
+                if line == "":
+                    break
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+            data = await reader.readexactly(int(headers.get("content-length", "0")))
+            body = json.loads(data.decode()) if data else None
+            url = urlsplit(target)
+            path = re.sub(r"^/v[0-9.]+/", "/", url.path)
+            params = { k : v[0] for k, v in parse_qs(url.query).items() }
+            self.requests.append((method, path))
+            if self.latency > 0:
+                await asyncio.sleep(self.latency)
+            for route_method, pattern, func in self.routes:
+                match = re.fullmatch(pattern, path)
+                if route_method == method and match:
+                    args = [ unquote(a) for a in match.groups() ]
+                    try:
+                        status, result = await func(params, body, *args)
+                    except KeyError as e:
+                        status, result = (404, {"message" : "No such object: %s" % e.args[0]})
+                    break
+            else:
+                status, result = (404, {"message" : "page not found"})
+            if isinstance(result, bytes):
+                # upgraded stream (exec output)
+                writer.write(b"HTTP/1.1 101 UPGRADED\r\nContent-Type: application/vnd.docker.multiplexed-stream\r\n"
+                             b"Connection: Upgrade\r\nUpgrade: tcp\r\n\r\n" + result)
+            else:
+                content = json.dumps(result).encode() if result is not None else b""
+                writer.write(("HTTP/1.1 %i X\r\nContent-Type: application/json\r\nContent-Length: %i\r\nConnection: close\r\n\r\n"
+                              % (status, len(content))).encode() + content)
+            await writer.drain()
+        finally:
+            writer.close()
+# }}}
+# {{{ Endpoints
+    async def get_version(self, params, body):
+        return (200, {"ApiVersion" : self.api_version, "Version" : "fake"})
+
+    async def list_containers(self, params, body):
+        labels = json.loads(params.get("filters", "{}")).get("label", [])
+        containers = []
+        for c in self.containers.values():
+            if params.get("all", "0") in ("0", "false") and c["State"] != "running":
+                continue
+            if all(c["Labels"].get(l.split("=", 1)[0]) == l.split("=", 1)[1] for l in labels):
+                containers.append(c)
+        return (200, containers)
+
+    async def create_container(self, params, body):
+        name = params["name"]
+        if any(c["Names"] == ["/" + name] for c in self.containers.values()):
+            return (409, {"message" : "Conflict. The container name \"/%s\" is already in use." % name})
+        cid = uuid.uuid4().hex * 2
+        binds = body.get("HostConfig", {}).get("Binds", [])
+        self.containers[cid] = {"Id" : cid,
+                                "Names" : ["/" + name],
+                                "Image" : body["Image"],
+                                "Labels" : body.get("Labels") or {},
+                                "State" : "created",
+                                "Mounts" : [ {"Source" : b.split(":")[0], "Destination" : b.split(":")[1]} for b in binds ],
+                                "Networks" : [],
+                                "Config" : body}
+        return (201, {"Id" : cid, "Warnings" : []})
+
+    async def start_container(self, params, body, cid):
+        container = self.containers[cid]
+        if container["State"] == "running":
+            return (304, None)
+        container["State"] = "running"
+        return (204, None)
+
+    async def stop_container(self, params, body, cid):
+        container = self.containers[cid]
+        if container["State"] != "running":
+            return (304, None)
+        container["State"] = "exited"
+        return (204, None)
+
+    async def remove_container(self, params, body, cid):
+        del self.containers[cid]
+        return (204, None)
+
+    async def connect_network(self, params, body, net):
+        self.containers[body["Container"]]["Networks"].append((net, body.get("EndpointConfig")))
+        return (200, None)
+
+    async def create_exec(self, params, body, cid):
+        if self.containers[cid]["State"] != "running":
+            return (409, {"message" : "Container %s is not running" % cid})
+        eid = uuid.uuid4().hex
+        self.execs[eid] = {"ID" : eid, "ContainerID" : cid, "Config" : body, "StartConfig" : None, "Running" : False, "ExitCode" : None}
+        return (201, {"Id" : eid})
+
+    async def start_exec(self, params, body, eid):
+        exi = self.execs[eid]
+        exi["StartConfig"] = body
+        output, exi["ExitCode"] = self.exec_handler(self.containers[exi["ContainerID"]], exi["Config"]["Cmd"])
+        # like docker, the output is only sent raw if the start request says so
+        if (body or {}).get("Tty"):
+            return (101, output)
+        return (101, struct.pack(">BxxxI", 1, len(output)) + output)
+
+    async def inspect_exec(self, params, body, eid):
+        return (200, self.execs[eid])
+# }}}
+
+# {{{ Main
+def main():
+    parser = argparse.ArgumentParser(description = "Fake Docker Engine API server (for tests).")
+    parser.add_argument("--socket", "-s", type=str, required=True, help="Path of the unix socket")
+    parser.add_argument("--latency", "-l", type=float, default=0.0, help="Delay of every request in seconds (default: 0)")
+    args = parser.parse_args()
+
+    async def serve():
+        server = fake_engine_api(args.socket, latency = args.latency)
+        await server.start()
+        print("Listening on '%s'." % args.socket)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
+# }}}
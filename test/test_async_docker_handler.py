@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+"""
+Tests for 'async_docker_handler', using the fake Engine API server (see 'fake_engine_api.py').
+"""
+
+import sys, os, asyncio
+import pytest
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
+from libexadt import EXAConf
+from libexadt.async_docker_handler import async_docker_handler
+from fake_engine_api import fake_engine_api
+
+num_nodes = 4
+
+# {{{ Fixtures
+@pytest.fixture
+def exaconf(tmp_path):
+    ec = EXAConf.EXAConf(str(tmp_path), False)
+    ec.initialize("test", "exasol/docker-db:latest", num_nodes, "file", False, "Docker",
+                  license = str(tmp_path / "license.xml"), quiet = True)
+    return ec
+
+def run_with_server(exaconf, func, exec_handler = None):
+    """
+    Starts a fake server and calls 'func(server, handler)' with an async_docker_handler that uses it.
+    """
+    async def run():
+        socket_path = os.path.join(exaconf.root, "docker.sock")
+        server = fake_engine_api(socket_path, exec_handler = exec_handler) if exec_handler else fake_engine_api(socket_path)
+        await server.start()
+        try:
+            adh = async_docker_handler(parallel = num_nodes, socket_path = socket_path)
+            adh.set_exaconf(exaconf)
+            return await func(server, adh)
+        finally:
+            await server.stop()
+    return asyncio.run(run())
+# }}}
+# {{{ Create and start
+def test_create_and_start_containers(exaconf):
+    async def test(server, adh):
+        containers = await adh.create_containers()
+        assert sorted(c['MyName'] for c in containers) == sorted("test_%s" % nid for nid in exaconf.get_nodes())
+        assert len(await adh.get_containers(all = False)) == 0
+        await adh.start_containers(containers)
+        running = await adh.get_containers(all = False)
+        assert len(running) == num_nodes
+        assert all(c['Labels']['ClusterName'] == "test" for c in running)
+        assert await adh.stop_containers(10) is True
+        assert len(await adh.get_containers(all = False)) == 0
+    run_with_server(exaconf, test)
+# }}}
+# {{{ Execute
+@pytest.mark.parametrize("tty", [False, True])
+def test_execute_container(exaconf, capsys, tty):
+    def exec_handler(container, cmd):
+        return (b"first line\nsecond line\n", 3 if cmd[0] == "false" else 0)
+
+    async def test(server, adh):
+        containers = await adh.create_containers()
+        await adh.start_containers(containers)
+        container = (await adh.get_containers())[0]
+        capsys.readouterr()
+        assert await adh.execute_container("true --arg", container, tty = tty, quiet = True, prefix = "[n] ") == 0
+        assert capsys.readouterr().out == "[n] first line\n[n] second line\n"
+        assert await adh.execute_container("false", container, tty = tty, quiet = True) == 3
+        # the TTY setting of the exec instance has to be given when starting it, too
+        for exi in server.execs.values():
+            assert exi['Config']['Tty'] is tty
+            assert exi['StartConfig']['Tty'] is tty
+        assert [ exi['Config']['Cmd'] for exi in server.execs.values() ] == [["true", "--arg"], ["false"]]
+    run_with_server(exaconf, test, exec_handler)
+# }}}